@@ -1,5 +1,7 @@
 from django.urls import path
 
+from core.budgets import Budget
+
 from . import views
 
 app_name = 'about'
@@ -8,3 +10,9 @@ urlpatterns = [
     path('author/', views.AboutAuthorView.as_view(), name='author'),
     path('tech/', views.AboutTechView.as_view(), name='tech'),
 ]
+
+# Бюджеты маршрутов, проверяет core.tests.BudgetTest
+budgets = {
+    'author': Budget(queries=0),
+    'tech': Budget(queries=0),
+}
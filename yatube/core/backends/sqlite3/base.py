@@ -0,0 +1,29 @@
+"""SQLite с прагмами и режимом транзакций из OPTIONS.
+
+OPTIONS['pragmas'] выполняются на каждом новом соединении: WAL, размеры
+кэша и mmap, busy_timeout. OPTIONS['transaction_mode'] = 'IMMEDIATE'
+берёт блокировку записи уже в начале atomic(). Иначе транзакция, которая
+начала с чтения, при первой записи сразу получает «database is locked»,
+не дожидаясь busy_timeout.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,42 @@
+"""Бюджеты страниц: запросы к базе, время рендера и размер ответа.
+
+Приложения объявляют в urls.py словарь budgets: имя маршрута → Budget.
+core.tests.BudgetTest обходит все маршруты на данных из posts.seed и
+падает, если ответ вышел за бюджет или у маршрута бюджета нет.
+"""
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from django.template.backends.django import Template
+
+
+class Budget(NamedTuple):
+    # Запросов при пустом кэше, то есть в худшем случае
+    queries: int
+    # Суммарное время рендера шаблонов, мс; запас на медленные машины
+    render_ms: float = 150
+    size_kb: int = 64
+
+
+@contextmanager
+def render_timer():
+    """Список времён рендера шаблонов верхнего уровня, мс.
+
+    Вложенные include и теги рендерятся внутри них и уже учтены.
+    """
+    timings = []
+    render = Template.render
+
+    def timed_render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timings.append((time.perf_counter() - start) * 1000)
+
+    Template.render = timed_render
+    try:
+        yield timings
+    finally:
+        Template.render = render
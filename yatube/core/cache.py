@@ -0,0 +1,87 @@
+"""Бэкенды кэша со счётчиками попаданий и промахов.
+
+Классы повторяют стандартные бэкенды Django и только считают обращения
+через get(). Фрагменты {% cache %} учитываются по имени фрагмента
+(index_page, group_page, ...), остальные ключи — общей строкой.
+Счётчики живут в памяти процесса: у каждого воркера свои.
+"""
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core.cache.backends import db, filebased, locmem, memcached
+
+from . import profiling
+
+FRAGMENT_PREFIX = 'template.cache.'
+OTHER = 'other'
+_MISSING = object()
+
+_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def key_namespace(key):
+    if key.startswith(FRAGMENT_PREFIX):
+        return key[len(FRAGMENT_PREFIX):].split('.', 1)[0]
+    return OTHER
+
+
+def record(key, hit):
+    namespace = key_namespace(key)
+    with _lock:
+        (_hits if hit else _misses)[namespace] += 1
+    profiling.record_cache(hit)
+
+
+def stats():
+    with _lock:
+        return {
+            namespace: {'hits': _hits[namespace], 'misses': _misses[namespace]}
+            for namespace in sorted(set(_hits) | set(_misses))
+        }
+
+
+def reset_stats():
+    with _lock:
+        _hits.clear()
+        _misses.clear()
+
+
+def check(cache):
+    """Пишет и читает пробный ключ; возвращает (ok, время в мс)."""
+    key = f'core:health:{uuid.uuid4().hex}'
+    value = uuid.uuid4().hex
+    start = time.monotonic()
+    try:
+        cache.set(key, value, 10)
+        ok = cache.get(key) == value
+        cache.delete(key)
+    except Exception:
+        ok = False
+    return ok, round((time.monotonic() - start) * 1000, 2)
+
+
+class HitMissCounterMixin:
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        record(key, value is not _MISSING)
+        return default if value is _MISSING else value
+
+
+class LocMemCache(HitMissCounterMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(HitMissCounterMixin, filebased.FileBasedCache):
+    pass
+
+
+class DatabaseCache(HitMissCounterMixin, db.DatabaseCache):
+    pass
+
+
+class MemcachedCache(HitMissCounterMixin, memcached.MemcachedCache):
+    pass
@@ -0,0 +1,44 @@
+from django.core.cache import caches
+from django.core.checks import Error, Tags, Warning, register
+from django.template import TemplateSyntaxError
+
+from . import templating
+from .cache import LocMemCache, check
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    errors = []
+    cache = caches['default']
+    if isinstance(cache, LocMemCache):
+        errors.append(Warning(
+            'Кэш LocMemCache свой у каждого процесса: сброс версий лент '
+            'не дойдёт до других воркеров.',
+            hint='Задайте CACHE_BACKEND=file, db или memcached.',
+            id='core.W001',
+        ))
+    ok, _ = check(cache)
+    if not ok:
+        errors.append(Error(
+            'Кэш по умолчанию не отвечает на запись и чтение.',
+            hint=(
+                'Проверьте CACHE_LOCATION; для CACHE_BACKEND=db создайте '
+                'таблицу командой createcachetable.'
+            ),
+            id='core.E001',
+        ))
+    return errors
+
+
+@register(Tags.templates)
+def template_syntax_check(app_configs, **kwargs):
+    errors = []
+    for engine, name in templating.templates():
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError as error:
+            errors.append(Error(
+                f'Ошибка синтаксиса в шаблоне {name}: {error}',
+                id='core.E002',
+            ))
+    return errors
@@ -0,0 +1,78 @@
+"""Помощники для загрузки данных и замеров вне тестов.
+
+keep_auto_now нужен импорту и генератору данных, temporary_database и
+private_cache — командам замеров. Все возвращают по выходе всё, что
+поменяли: поле модели, настройки соединения и кэши общие для процесса.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+
+# Свой LocMemCache вместо общего кэша сайта: seed и замеры его чистят
+PRIVATE_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.LocMemCache',
+        'LOCATION': 'core.db.private_cache',
+    },
+}
+
+
+@contextmanager
+def keep_auto_now(model, name):
+    """bulk_create сохраняет заданную дату вместо текущего времени."""
+    field = model._meta.get_field(name)
+    auto_now_add = field.auto_now_add
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = auto_now_add
+
+
+@contextmanager
+def temporary_database():
+    """Отдельная тестовая база на время замеров.
+
+    Для SQLite это временный файл: миллион постов в памяти не поместится,
+    а потоки замеров должны видеть одну и ту же базу.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    path = None
+    if connection.vendor == 'sqlite':
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        test_settings['NAME'] = path
+    try:
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            # Возвращает NAME в соединение и в settings.DATABASES
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        test_settings['NAME'] = old_test_name
+        if path is not None:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+
+@contextmanager
+def private_cache():
+    """Отдельный кэш в памяти процесса на время замеров.
+
+    cache.clear() в замерах иначе стёр бы общий кэш работающего сайта,
+    а версии лент из временной базы остались бы в нём.
+    """
+    with override_settings(CACHES=PRIVATE_CACHES):
+        try:
+            yield
+        finally:
+            cache.clear()
@@ -0,0 +1,215 @@
+"""Выборочное профилирование запросов в продакшене.
+
+ProfilingMiddleware измеряет долю PROFILING_SAMPLE_RATE запросов: общее
+время, время и число запросов к базе (и отдельно к каждой реплике),
+время рендера шаблонов, попадания и промахи кэша. Замеры копятся в
+кольцевом буфере процесса на PROFILING_BUFFER_SIZE записей; страница
+/profiling/ для сотрудников показывает по ним перцентили каждого view.
+Доля PROFILING_CPROFILE_RATE из измеренных запросов дополнительно
+выполняется под cProfile, и последние PROFILING_TRACES отчётов хранятся
+там же.
+
+Время шаблонов меряет подмена Template.render. Она общая для процесса,
+поэтому ставится только на время замеряемых запросов: первый из них
+подменяет метод, последний возвращает прежний. Незамеряемые запросы
+других потоков, попавшие в это окно, проходят подмену насквозь.
+"""
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils import timezone
+
+UNRESOLVED = '(без маршрута)'
+TRACE_LINES = 40
+
+_lock = threading.Lock()
+_samples = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+_traces = deque(maxlen=settings.PROFILING_TRACES)
+_local = threading.local()
+_patches = 0
+_render = Template.render
+
+
+class Sample:
+    __slots__ = (
+        'view', 'status', 'total_ms', 'db_ms', 'queries', 'template_ms',
+        'cache_hits', 'cache_misses', 'aliases',
+    )
+
+    def __init__(self):
+        self.db_ms = self.template_ms = 0.0
+        self.queries = self.cache_hits = self.cache_misses = 0
+        self.aliases = Counter()
+
+
+def current():
+    """Замер текущего запроса потока или None."""
+    return getattr(_local, 'sample', None)
+
+
+def record_cache(hit):
+    sample = current()
+    if sample is None:
+        return
+    if hit:
+        sample.cache_hits += 1
+    else:
+        sample.cache_misses += 1
+
+
+def _timed_query(execute, sql, params, many, context):
+    sample = current()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if sample is not None:
+            sample.db_ms += (time.perf_counter() - start) * 1000
+            sample.queries += 1
+            sample.aliases[context['connection'].alias] += 1
+
+
+def _timed_render(self, *args, **kwargs):
+    # Считаются только шаблоны верхнего уровня: include и теги
+    # рендерятся внутри них через движок, а не через бэкенд
+    sample = current()
+    if sample is None:
+        return _render(self, *args, **kwargs)
+    start = time.perf_counter()
+    try:
+        return _render(self, *args, **kwargs)
+    finally:
+        sample.template_ms += (time.perf_counter() - start) * 1000
+
+
+@contextmanager
+def timed_templates():
+    """Подменяет Template.render, пока идёт хоть один замер."""
+    global _patches, _render
+    with _lock:
+        if not _patches:
+            _render = Template.render
+            Template.render = _timed_render
+        _patches += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _patches -= 1
+            # Метод мог подменить кто-то ещё: тогда он вернёт его сам
+            if not _patches and Template.render is _timed_render:
+                Template.render = _render
+
+
+def samples():
+    with _lock:
+        return list(_samples)
+
+
+def traces():
+    with _lock:
+        return list(_traces)
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _traces.clear()
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга; share от 0 до 1."""
+    values = sorted(values)
+    return values[max(int(len(values) * share + 0.5) - 1, 0)]
+
+
+def report():
+    """Сводка по view: число замеров, перцентили и средние доли."""
+    by_view = defaultdict(list)
+    for sample in samples():
+        by_view[sample.view].append(sample)
+    rows = []
+    for view, items in by_view.items():
+        total = [sample.total_ms for sample in items]
+        count = len(items)
+        lookups = sum(s.cache_hits + s.cache_misses for s in items)
+        aliases = sum((s.aliases for s in items), Counter())
+        rows.append({
+            'view': view,
+            'count': count,
+            'p50_ms': percentile(total, 0.5),
+            'p95_ms': percentile(total, 0.95),
+            'p99_ms': percentile(total, 0.99),
+            'db_ms': sum(s.db_ms for s in items) / count,
+            'queries': sum(s.queries for s in items) / count,
+            'aliases': [
+                (alias, total / count)
+                for alias, total in sorted(aliases.items())
+            ],
+            'template_ms': sum(s.template_ms for s in items) / count,
+            'cache_hit_rate': (
+                sum(s.cache_hits for s in items) / lookups
+                if lookups else None
+            ),
+        })
+    return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)
+
+
+class ProfilingMiddleware:
+    """Ставится первым, чтобы время включало все остальные middleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        sample = _local.sample = Sample()
+        profiler = None
+        if random.random() < settings.PROFILING_CPROFILE_RATE:
+            profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(timed_templates())
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_timed_query))
+                if profiler is None:
+                    response = self.get_response(request)
+                else:
+                    response = profiler.runcall(self.get_response, request)
+        finally:
+            _local.sample = None
+        sample.total_ms = (time.perf_counter() - start) * 1000
+        match = request.resolver_match
+        sample.view = match.view_name if match else UNRESOLVED
+        sample.status = response.status_code
+        trace = (
+            self.trace(request, sample, profiler) if profiler else None)
+        with _lock:
+            _samples.append(sample)
+            if trace is not None:
+                _traces.append(trace)
+        return response
+
+    def trace(self, request, sample, profiler):
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(TRACE_LINES)
+        return {
+            'view': sample.view,
+            'path': request.get_full_path(),
+            'total_ms': sample.total_ms,
+            'time': timezone.now(),
+            'stats': stream.getvalue(),
+        }
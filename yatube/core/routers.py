@@ -0,0 +1,145 @@
+"""Чтение страниц с реплик базы.
+
+Views, помеченные replica_reads, на GET и HEAD читают из реплики —
+случайной из DATABASE_REPLICAS, одной на весь запрос. Запись всегда идёт
+в default. Реплики отстают от основной базы (локально их догоняет
+команда sync_replicas), поэтому после записи ReplicaMiddleware ставит
+куку, и REPLICA_PIN_SECONDS пользователь читает с основной базы: свой
+пост или комментарий он увидит сразу. В пределах запроса после первой
+записи чтение тоже переходит на default.
+
+Версии лент (posts/feed_cache.py) сбрасываются записью в основную базу
+сразу, а реплика догоняет позже. Чтобы прочитанное с реплики не попало
+в кэш под новой версией, sync_replicas после копирования записывает в
+кэш точку синхронизации реплики, и она входит в ключи фрагментов и
+ETag при чтении с реплики: после следующей синхронизации эти ключи
+меняются. Реплика без известной точки (кэш не общий с sync_replicas)
+не используется.
+"""
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'read_primary'
+POSITION_KEY = 'core:replica_position:{}'
+# Таблица кэша (CACHE_BACKEND=db) и сессии: на отстающей реплике новой
+# сессии ещё нет, и SessionMiddleware стёр бы куку только что вошедшего
+PRIMARY_ONLY = {'django_cache', 'sessions'}
+SAFE_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+def replica_reads(view):
+    """Помечает view только для чтения: его запросы можно слать репликам."""
+    view.replica_reads = True
+    return view
+
+
+def current_replica():
+    return getattr(_local, 'replica', None)
+
+
+def replica_position():
+    """Реплика запроса и точка её синхронизации или None."""
+    return getattr(_local, 'position', None)
+
+
+def replica_synced_at():
+    """Время синхронизации реплики запроса в секундах или None."""
+    return getattr(_local, 'synced_at', None)
+
+
+def _use_primary():
+    _local.replica = None
+    _local.position = None
+    _local.synced_at = None
+
+
+def copy_database(path):
+    """Копирует основную базу SQLite в файл реплики через backup API."""
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
+
+
+def sync(alias):
+    """Копирует основную базу в реплику и отмечает точку копирования."""
+    # Отметка ставится на начало копирования: всё, что закоммичено до
+    # него, в копию попало
+    position = int(time.time() * 1000)
+    copy_database(connections[alias].settings_dict['NAME'])
+    cache.set(POSITION_KEY.format(alias), position, None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY:
+            return DEFAULT_DB_ALIAS
+        return current_replica()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_ONLY:
+            _use_primary()
+            _local.wrote = True
+        # Явно: иначе объект, прочитанный с реплики, сохранился бы в неё
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема приходит в реплику вместе с данными
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Ставится до SessionMiddleware, чтобы заметить и запись сессии."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _use_primary()
+        _local.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_primary()
+        if _local.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.DATABASE_REPLICAS
+                and request.method in SAFE_METHODS
+                and getattr(view_func, 'replica_reads', False)
+                and PIN_COOKIE not in request.COOKIES
+                and not _local.wrote):
+            # Пользователь тоже читается с основной базы, пока реплика
+            # не выбрана: иначе свежий вход выглядел бы гостевым
+            if hasattr(request, 'user'):
+                request.user.is_authenticated
+            alias = random.choice(settings.DATABASE_REPLICAS)
+            position = cache.get(POSITION_KEY.format(alias))
+            if position is not None:
+                _local.replica = alias
+                _local.position = f'{alias}@{position}'
+                _local.synced_at = position // 1000
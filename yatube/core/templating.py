@@ -0,0 +1,36 @@
+"""Разбор шаблонов при старте процесса.
+
+Кэширующий загрузчик (TEMPLATE_CACHE) разбирает шаблон один раз на
+процесс, но без подготовки за разбор base.html, шапки, пагинатора и
+остальных платил бы первый запрос каждого воркера. Когда загрузчик
+включён, preload() из wsgi.py заранее разбирает все шаблоны из DIRS, и
+ошибка синтаксиса роняет старт воркера, а не запрос пользователя.
+Проверка core.E002 находит те же ошибки в manage.py check, runserver и
+тестах.
+"""
+import os
+
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+
+def templates():
+    """Пары (движок, имя) для всех файлов из DIRS движков Django."""
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for directory in engine.engine.dirs:
+            for root, _, files in os.walk(directory):
+                for filename in sorted(files):
+                    path = os.path.join(root, filename)
+                    name = os.path.relpath(path, directory)
+                    yield engine, name.replace(os.sep, '/')
+
+
+def preload():
+    """Разбирает все шаблоны; TemplateSyntaxError не перехватывается."""
+    count = 0
+    for engine, name in templates():
+        engine.get_template(name)
+        count += 1
+    return count
@@ -1,4 +1,38 @@
-from django.test import TestCase
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.checks import run_checks
+from django.db import OperationalError, connection
+from django.db.utils import ConnectionDoesNotExist
+from django.http import HttpResponse
+from django.template import TemplateSyntaxError
+from django.template.backends.django import Template
+from django.test import (
+    Client, RequestFactory, TestCase, TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from about import urls as about_urls
+from core import cache as cache_stats
+from core import db, profiling, routers, templating
+from core.backends.sqlite3.base import DatabaseWrapper
+from core.budgets import render_timer
+from posts import (
+    feed_cache, page_cache, search, seed, stats, timeline, views)
+from posts.models import Post
+from posts import urls as posts_urls
+from users import urls as users_urls
+
+User = get_user_model()
+
+BUDGETED_URLS = (posts_urls, users_urls, about_urls)
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +40,485 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class CacheStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_stats.reset_stats()
+
+    def test_fragment_hits_and_misses_are_counted(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            cache_stats.stats()['index_page'], {'hits': 1, 'misses': 1})
+
+    def test_cache_health(self):
+        response = self.client.get(reverse('cache_health'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['ok'])
+        self.assertIn('stats', response.json())
+
+    def test_locmem_cache_warns_on_deploy(self):
+        ids = [
+            error.id for error in run_checks(include_deployment_checks=True)
+        ]
+        self.assertIn('core.W001', ids)
+
+
+class FileCacheTest(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+
+    def test_file_cache_is_shared_and_healthy(self):
+        with self.settings(CACHES={'default': {
+            'BACKEND': 'core.cache.FileBasedCache',
+            'LOCATION': self.location,
+        }}):
+            ok, _ = cache_stats.check(cache)
+            ids = [
+                error.id
+                for error in run_checks(include_deployment_checks=True)
+            ]
+        self.assertTrue(ok)
+        self.assertNotIn('core.W001', ids)
+        self.assertNotIn('core.E001', ids)
+
+
+class SQLiteBackendTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.name = f'{self.dir}/db.sqlite3'
+        self.connections = []
+
+    def tearDown(self):
+        for wrapper in self.connections:
+            wrapper.close()
+        shutil.rmtree(self.dir)
+
+    def connect(self, **pragmas):
+        settings_dict = dict(connection.settings_dict, NAME=self.name)
+        settings_dict['OPTIONS'] = dict(
+            settings_dict['OPTIONS'],
+            pragmas=dict(settings_dict['OPTIONS']['pragmas'], **pragmas)
+        )
+        wrapper = DatabaseWrapper(settings_dict, alias='sqlite_test')
+        self.connections.append(wrapper)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        wrapper = self.connect()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        # NORMAL
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(
+            self.pragma(wrapper, 'busy_timeout'),
+            settings.SQLITE_PRAGMAS['busy_timeout']
+        )
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -64000)
+
+    def test_atomic_takes_write_lock_immediately(self):
+        first = self.connect()
+        second = self.connect(busy_timeout=0)
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x INTEGER)')
+        # Так транзакцию начинает atomic()
+        first.set_autocommit(
+            False, force_begin_transaction_with_broken_autocommit=True)
+        with first.cursor() as cursor:
+            # Пока только чтение, но блокировка записи уже взята
+            cursor.execute('SELECT COUNT(*) FROM t')
+        with self.assertRaises(OperationalError):
+            with second.cursor() as other:
+                other.execute('INSERT INTO t VALUES (1)')
+        first.rollback()
+
+    def test_form_pages_do_not_hold_write_lock(self):
+        user = User.objects.create_user(username='Writer')
+        post = Post.objects.create(author=user, text='Пост')
+        self.client.force_login(user)
+        urls = [
+            reverse('posts:post_create'),
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                # atomic() внутри теста — это SAVEPOINT
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertFalse([
+                    query for query in queries
+                    if 'SAVEPOINT' in query['sql']
+                ])
+
+
+class TemplatePreloadTest(TestCase):
+    def test_all_templates_parse(self):
+        names = [name for _, name in templating.templates()]
+        self.assertIn('includes/header.html', names)
+        self.assertEqual(templating.preload(), len(names))
+        ids = [message.id for message in run_checks()]
+        self.assertNotIn('core.E002', ids)
+
+    def test_syntax_error_fails_fast(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(f'{directory}/broken.html', 'w') as stream:
+            stream.write('{% if %}')
+        templates = [dict(settings.TEMPLATES[0], DIRS=[directory])]
+        with override_settings(TEMPLATES=templates):
+            messages = [
+                message for message in run_checks()
+                if message.id == 'core.E002'
+            ]
+            self.assertEqual(len(messages), 1)
+            self.assertIn('broken.html', messages[0].msg)
+            with self.assertRaises(TemplateSyntaxError):
+                templating.preload()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTest(TestCase):
+    """Решения роутера; запросов к несуществующей реплике нет."""
+
+    def setUp(self):
+        cache.clear()
+        cache.set(routers.POSITION_KEY.format('replica1'), 1, None)
+        self.factory = RequestFactory()
+        self.router = routers.ReplicaRouter()
+
+    def request(self, view, method='get', cookies=None, write=False,
+                model=Post, read=None):
+        request = getattr(self.factory, method)('/')
+        request.COOKIES.update(cookies or {})
+        databases = []
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            if write:
+                self.router.db_for_write(Post)
+            databases.append(self.router.db_for_read(model))
+            if read is not None:
+                read()
+            self.feed_key = feed_cache.feed_cache(
+                request, feed_cache.INDEX)['feed_cache_key']
+            self.last_modified = feed_cache.validators(
+                [feed_cache.INDEX])[1]()
+            request.page_cacheable = True
+            self.shared = page_cache.share(request, [feed_cache.INDEX])
+            return HttpResponse()
+
+        middleware = routers.ReplicaMiddleware(get_response)
+        response = middleware(request)
+        return databases[0], response
+
+    def test_read_view_uses_replica(self):
+        database, response = self.request(views.index)
+        self.assertEqual(database, 'replica1')
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+        # Вне запроса чтение идёт в основную базу
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_replica_reads_are_cached_under_its_position(self):
+        self.request(views.index, cookies={routers.PIN_COOKIE: '1'})
+        primary_key = self.feed_key
+        self.assertTrue(self.shared)
+        self.request(views.index)
+        self.assertIn('replica1@1', self.feed_key)
+        self.assertNotEqual(self.feed_key, primary_key)
+        # Полная страница с реплики в общий кэш не попадает
+        self.assertFalse(self.shared)
+        replica_key = self.feed_key
+        cache.set(routers.POSITION_KEY.format('replica1'), 2, None)
+        self.request(views.index)
+        self.assertNotEqual(self.feed_key, replica_key)
+
+    def test_replica_page_is_not_newer_than_sync(self):
+        feed_cache.bump(feed_cache.INDEX)
+        self.request(views.index, cookies={routers.PIN_COOKIE: '1'})
+        self.assertGreater(self.last_modified, 0)
+        # Реплика синхронизирована в первую миллисекунду эпохи
+        self.request(views.index)
+        self.assertEqual(self.last_modified, 0)
+
+    def test_cached_state_is_read_from_primary(self):
+        # Запрос к реплике упал бы: соединения replica1 в тестах нет
+        user = User.objects.create_user(username='Reader')
+
+        def read():
+            timeline.hot_author_ids()
+            timeline.is_incomplete(user)
+            stats.rebuild(user.pk)
+
+        database, _ = self.request(views.index, read=read)
+        self.assertEqual(database, 'replica1')
+
+    def test_search_reads_where_posts_are_loaded(self):
+        def read():
+            # Соединения replica1 нет: поиск идёт туда же, куда in_bulk
+            with self.assertRaises(ConnectionDoesNotExist):
+                search.get_backend().count('текст')
+
+        self.request(views.post_search, read=read)
+
+    def test_unsynced_replica_is_not_used(self):
+        cache.delete(routers.POSITION_KEY.format('replica1'))
+        self.assertIsNone(self.request(views.index)[0])
+
+    def test_sessions_stay_on_primary(self):
+        database, _ = self.request(views.index, model=Session)
+        self.assertEqual(database, 'default')
+
+    def test_other_views_and_methods_use_primary(self):
+        self.assertIsNone(self.request(views.post_create)[0])
+        self.assertIsNone(self.request(views.index, method='post')[0])
+
+    def test_write_pins_to_primary(self):
+        database, response = self.request(views.index, write=True)
+        self.assertIsNone(database)
+        cookie = response.cookies[routers.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        database, _ = self.request(
+            views.index, cookies={routers.PIN_COOKIE: '1'})
+        self.assertIsNone(database)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        database, response = self.request(views.index, write=True)
+        self.assertIsNone(database)
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_writes_and_migrations_stay_on_primary(self):
+        post = Post(text='Текст')
+        post._state.db = 'replica1'
+        self.assertEqual(
+            self.router.db_for_write(Post, instance=post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+class CopyDatabaseTest(TransactionTestCase):
+    # backup API ждёт, пока основная база выйдет из транзакции TestCase
+    def test_copy_database(self):
+        Post.objects.create(
+            text='Текст', author=User.objects.create_user(username='User'))
+        path = f'{tempfile.mkdtemp()}/replica.sqlite3'
+        self.addCleanup(shutil.rmtree, path.rsplit('/', 1)[0])
+        routers.copy_database(path)
+        replica = sqlite3.connect(path)
+        self.addCleanup(replica.close)
+        count, = replica.execute('SELECT COUNT(*) FROM posts_post').fetchone()
+        self.assertEqual(count, 1)
+
+
+class DatabaseHelpersTest(TestCase):
+    def test_keep_auto_now_restores_field(self):
+        field = Post._meta.get_field('pub_date')
+        with db.keep_auto_now(Post, 'pub_date'):
+            self.assertFalse(field.auto_now_add)
+        self.assertTrue(field.auto_now_add)
+        field.auto_now_add = False
+        self.addCleanup(setattr, field, 'auto_now_add', True)
+        with db.keep_auto_now(Post, 'pub_date'):
+            pass
+        self.assertFalse(field.auto_now_add)
+
+    def test_private_cache_keeps_site_cache(self):
+        cache.set('site', 1)
+        self.addCleanup(cache.delete, 'site')
+        with db.private_cache():
+            self.assertIsNone(cache.get('site'))
+            cache.set('benchmark', 1)
+            cache.clear()
+        self.assertEqual(cache.get('site'), 1)
+        self.assertIsNone(cache.get('benchmark'))
+
+    def test_temporary_database_restores_test_name(self):
+        # Настоящая база здесь не создаётся: тестовую в памяти закрытие
+        # соединения уничтожило бы
+        test_name = connection.settings_dict['TEST'].get('NAME')
+        paths = []
+
+        def create_test_db(**kwargs):
+            paths.append(connection.settings_dict['TEST']['NAME'])
+
+        creation = connection.creation
+        with mock.patch.object(creation, 'create_test_db', create_test_db), \
+                mock.patch.object(creation, 'destroy_test_db') as destroy:
+            with db.temporary_database():
+                pass
+        destroy.assert_called_once()
+        path, = paths
+        self.assertNotEqual(path, test_name)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(connection.settings_dict['TEST'].get('NAME'),
+                         test_name)
+
+    def test_temporary_database_cleans_up_failed_creation(self):
+        test_name = connection.settings_dict['TEST'].get('NAME')
+        creation = connection.creation
+        with mock.patch.object(creation, 'create_test_db',
+                               side_effect=OperationalError), \
+                mock.patch.object(creation, 'destroy_test_db') as destroy:
+            with self.assertRaises(OperationalError):
+                with db.temporary_database():
+                    pass
+        destroy.assert_not_called()
+        self.assertEqual(connection.settings_dict['TEST'].get('NAME'),
+                         test_name)
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_CPROFILE_RATE=0)
+class ProfilingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+
+    def test_samples_requests(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get('/nonexist-page/')
+        rows = {row['view']: row for row in profiling.report()}
+        index = rows['posts:index']
+        self.assertEqual(index['count'], 2)
+        self.assertGreater(index['queries'], 0)
+        self.assertGreater(index['template_ms'], 0)
+        self.assertIsNotNone(index['cache_hit_rate'])
+        self.assertEqual(index['aliases'][0][0], 'default')
+        self.assertIn(profiling.UNRESOLVED, rows)
+
+    def test_render_is_patched_only_while_sampling(self):
+        render = Template.render
+        patched = []
+
+        def get_response(request):
+            patched.append(Template.render is not render)
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        profiling.ProfilingMiddleware(get_response)(request)
+        self.assertEqual(patched, [True])
+        self.assertIs(Template.render, render)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_sampling_disabled(self):
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(profiling.samples(), [])
+
+    @override_settings(PROFILING_CPROFILE_RATE=1)
+    def test_cprofile_trace(self):
+        self.client.get(reverse('posts:index'))
+        trace, = profiling.traces()
+        self.assertEqual(trace['view'], 'posts:index')
+        self.assertIn('cumulative', trace['stats'])
+
+    def test_report_page_is_staff_only(self):
+        url = reverse('profiling')
+        user = User.objects.create_user(username='User')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        user.is_staff = True
+        user.save()
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(url)
+        self.assertContains(response, 'posts:index')
+
+
+class BudgetTest(TestCase):
+    """Каждый маршрут укладывается в бюджет из budgets своего urls.py."""
+
+    @classmethod
+    def setUpTestData(cls):
+        objects = seed.seed(300, users=30, random_seed=1)
+        cls.author = objects['author']
+        cls.reader = objects['reader']
+        post = objects['post']
+        other = cls.reader.follower.values_list(
+            'author__username', flat=True).first()
+        # Имя маршрута: (клиент, аргументы URL, метод, ожидаемый статус)
+        cls.routes = {
+            'posts:index': ('guest', {}, 'get', 200),
+            'posts:group_list': (
+                'guest', {'slug': objects['group'].slug}, 'get', 200),
+            'posts:profile': (
+                'guest', {'username': cls.author.username}, 'get', 200),
+            'posts:post_detail': (
+                'guest', {'post_id': post.pk}, 'get', 200),
+            'posts:post_create': ('author', {}, 'get', 200),
+            'posts:post_edit': (
+                'poster', {'post_id': post.pk}, 'get', 200),
+            'posts:add_comment': (
+                'reader', {'post_id': post.pk}, 'post', 302),
+            'posts:post_comments': (
+                'guest', {'post_id': post.pk}, 'get', 200),
+            'posts:search': ('guest', {}, 'get', 200),
+            'posts:fragment': ('reader', {'name': 'header'}, 'get', 200),
+            'posts:follow_index': ('reader', {}, 'get', 200),
+            'posts:profile_follow': (
+                'reader', {'username': cls.author.username}, 'get', 302),
+            'posts:profile_unfollow': (
+                'reader', {'username': other}, 'get', 302),
+            'posts:api_index': ('guest', {}, 'get', 200),
+            'posts:api_post_detail': (
+                'guest', {'post_id': post.pk}, 'get', 200),
+            'posts:api_group_list': (
+                'guest', {'slug': objects['group'].slug}, 'get', 200),
+            'posts:api_profile': (
+                'guest', {'username': cls.author.username}, 'get', 200),
+            'posts:api_follow_index': ('reader', {}, 'get', 200),
+            'users:signup': ('guest', {}, 'get', 200),
+            'users:login': ('guest', {}, 'get', 200),
+            'users:logout': ('reader', {}, 'get', 200),
+            'about:author': ('guest', {}, 'get', 200),
+            'about:tech': ('guest', {}, 'get', 200),
+        }
+        cls.post = post
+
+    def setUp(self):
+        self.clients = {'guest': Client()}
+        users = {
+            'author': self.author,
+            'reader': self.reader,
+            'poster': self.post.author,
+        }
+        for name, user in users.items():
+            self.clients[name] = Client()
+            self.clients[name].force_login(user)
+
+    def request(self, name):
+        client, kwargs, method, status = self.routes[name]
+        data = {'q': self.post.text.split()[0]} if method == 'get' else {
+            'text': 'Комментарий'}
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries, \
+                render_timer() as timings:
+            response = getattr(self.clients[client], method)(
+                reverse(name, kwargs=kwargs), data)
+        self.assertEqual(response.status_code, status)
+        return len(queries), sum(timings), len(response.content) / 1024
+
+    def test_every_route_has_budget(self):
+        for module in BUDGETED_URLS:
+            for pattern in module.urlpatterns:
+                name = f'{module.app_name}:{pattern.name}'
+                with self.subTest(route=name):
+                    self.assertIn(pattern.name, module.budgets)
+                    self.assertIn(name, self.routes)
+
+    def test_budgets(self):
+        for module in BUDGETED_URLS:
+            for route, budget in module.budgets.items():
+                name = f'{module.app_name}:{route}'
+                with self.subTest(route=name):
+                    queries, render_ms, size_kb = self.request(name)
+                    self.assertLessEqual(queries, budget.queries, 'запросы')
+                    self.assertLessEqual(
+                        render_ms, budget.render_ms, 'рендер, мс')
+                    self.assertLessEqual(size_kb, budget.size_kb, 'ответ, КБ')
@@ -1,5 +1,12 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import cache as cache_stats
+from . import profiling
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию,
@@ -17,3 +24,25 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def cache_health(request):
+    ok, latency = cache_stats.check(cache)
+    return JsonResponse(
+        {
+            'ok': ok,
+            'backend': settings.CACHES['default']['BACKEND'],
+            'latency_ms': latency,
+            'stats': cache_stats.stats(),
+        },
+        status=200 if ok else 503
+    )
+
+
+@staff_member_required
+def profiling_report(request):
+    return render(request, 'core/profiling.html', {
+        'rows': profiling.report(),
+        'traces': profiling.traces()[::-1],
+        'sample_rate': settings.PROFILING_SAMPLE_RATE,
+    })
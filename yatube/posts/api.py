@@ -0,0 +1,158 @@
+"""JSON API лент только для чтения.
+
+Повторяет index, group_posts, profile, follow_index и post_detail.
+Страницы листаются курсором (?cursor=), ?fields=id,text выбирает поля.
+ETag строится из версий лент (feed_cache), поэтому ответ 304 не
+обращается к базе, а Last-Modified — время последнего сброса версий.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from . import feed_cache, timeline
+from .conditional import conditional
+from .models import Group, Post
+from .pagination import KeysetPaginator
+from .views import comments_page
+
+User = get_user_model()
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created.isoformat(),
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def requested_fields(request):
+    fields = request.GET.get('fields')
+    if not fields:
+        return list(POST_FIELDS)
+    fields = fields.split(',')
+    unknown = [field for field in fields if field not in POST_FIELDS]
+    if unknown:
+        raise FieldsError(f'Неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def serialize(obj, getters, fields):
+    return {field: getters[field](obj) for field in fields}
+
+
+def error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def page_links(request, page):
+    return {
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+    }
+
+
+def keyset(post_list):
+    """get_page для feed(): курсорные страницы post_list."""
+    return lambda cursor: KeysetPaginator(
+        post_list, settings.POSTS_ON_PAGES, cursor).get_page()
+
+
+def feed(request, get_page, *scopes):
+    try:
+        fields = requested_fields(request)
+    except FieldsError as exc:
+        return error(str(exc), 400)
+    cursor = request.GET.get('cursor')
+    etag, last_modified = feed_cache.validators(
+        scopes, cursor, *fields)
+
+    def render():
+        page = get_page(cursor)
+        return JsonResponse({
+            'results': [
+                serialize(post, POST_FIELDS, fields) for post in page],
+            **page_links(request, page),
+        })
+
+    return conditional(request, etag, last_modified, render)
+
+
+def index(request):
+    return feed(request, keyset(Post.objects.feed()), feed_cache.INDEX)
+
+
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return feed(
+        request, keyset(group.posts.feed()),
+        feed_cache.group_scope(group.pk)
+    )
+
+
+def profile(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return feed(
+        request, keyset(author.posts.feed()),
+        feed_cache.author_scope(author.pk)
+    )
+
+
+def follow_index(request):
+    user = request.user
+    if not user.is_authenticated:
+        return error('Нужна авторизация', 401)
+    return feed(
+        request,
+        lambda cursor: timeline.keyset_page(
+            user, settings.POSTS_ON_PAGES, cursor),
+        feed_cache.INDEX, feed_cache.follow_scope(user.pk)
+    )
+
+
+def post_detail(request, post_id):
+    try:
+        fields = requested_fields(request)
+    except FieldsError as exc:
+        return error(str(exc), 400)
+    posts = Post.objects.feed().filter(pk=post_id)
+    etag, last_modified = feed_cache.validators(
+        [feed_cache.post_scope(post_id)],
+        request.GET.get('cursor'), request.GET.get('order'), *fields
+    )
+
+    def render():
+        post = get_object_or_404(posts)
+        comments, _ = comments_page(request, post)
+        return JsonResponse({
+            **serialize(post, POST_FIELDS, fields),
+            'comments': {
+                'results': [
+                    serialize(comment, COMMENT_FIELDS, COMMENT_FIELDS)
+                    for comment in comments
+                ],
+                **page_links(request, comments),
+            },
+        })
+
+    return conditional(request, etag, last_modified, render)
@@ -0,0 +1,50 @@
+"""Условные ответы GET по ETag и Last-Modified."""
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+def conditional(request, etag, last_modified, render):
+    """304, если у клиента актуальная копия, иначе ответ render().
+
+    last_modified — функция, которая возвращает timestamp или None.
+    При If-None-Match дата в проверке не участвует (RFC 7232), поэтому
+    для ответа 304 её не считаем.
+    """
+    etag = quote_etag(etag)
+    if request.META.get('HTTP_IF_NONE_MATCH'):
+        modified = None
+        response = get_conditional_response(request, etag=etag)
+    else:
+        modified = last_modified()
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified)
+    if response is None:
+        response = render()
+        if modified is None:
+            modified = last_modified()
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
+
+
+def feed_cache_control(request, response, shared=False):
+    """Cache-Control и Vary для HTML-лент.
+
+    Страницу гостя прокси может отдавать всем гостям FEED_HTTP_MAX_AGE
+    секунд; браузер каждый раз сверяет ETag. Страница пользователя
+    содержит его имя и кэшируется только в его браузере. Общая страница
+    из кэша страниц (shared) от пользователя не зависит, но её вариант
+    зависит от куки сессии (page_cache.variant).
+    """
+    if shared or not request.user.is_authenticated:
+        patch_cache_control(
+            response, public=True, max_age=0,
+            s_maxage=settings.FEED_HTTP_MAX_AGE
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
@@ -0,0 +1,132 @@
+"""Версии кэша страниц лент.
+
+Фрагменты index, group_posts и profile кэшируются с ключом, в который
+входит счётчик версии ленты. Сохранение или удаление поста увеличивает
+версии главной, группы и автора, поэтому устаревшие фрагменты просто
+перестают запрашиваться и вытесняются по FEED_CACHE_TIMEOUT.
+Переименование группы или автора сбрасывает все ленты с их постами
+(posts/signals.py): название, slug и имя показываются в каждом посте.
+
+При чтении с реплики к версии добавляется точка синхронизации реплики
+(core/routers.py): версия сбрасывается сразу, а реплика отстаёт, и без
+этого её старые данные легли бы в кэш под новой версией.
+
+Те же версии дают валидаторы для условных ответов без обращения к
+базе: ETag — из версий, Last-Modified — самое позднее время сброса
+версий страницы, которое bump запоминает рядом с версией.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.routers import replica_position, replica_synced_at
+
+VERSION_KEY = 'posts:feed_version:{}'
+MODIFIED_KEY = 'posts:feed_modified:{}'
+INDEX = 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    """Пост и его комментарии."""
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    """Подписки читателя; сами посты ленты меняют версию INDEX."""
+    return f'follow:{user_id}'
+
+
+def _initial_version():
+    # Если ключ версии вытеснен, новая версия не совпадёт со старой.
+    return int(time.time() * 1000)
+
+
+def get_version(scope):
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(*scopes):
+    now = int(time.time())
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+        cache.set(MODIFIED_KEY.format(scope), now, None)
+
+
+def modified(scopes):
+    """Время последнего сброса версий областей, timestamp в секундах."""
+    keys = [MODIFIED_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Время вытеснено или версию ещё не сбрасывали: считаем
+            # изменённой сейчас, чтобы не ответить 304 на старую копию
+            cache.add(key, int(time.time()), None)
+            found[key] = cache.get(key)
+    return max(found.values())
+
+
+def bump_post(post):
+    """Сбрасывает ленты, в которых показывается пост."""
+    scopes = [INDEX, author_scope(post.author_id), post_scope(post.pk)]
+    if post.group_id is not None:
+        scopes.append(group_scope(post.group_id))
+    bump(*scopes)
+
+
+def feed_cache(request, scope, *vary_on):
+    """Контекст для {% cache feed_cache_timeout ... feed_cache_key %}."""
+    key = [
+        get_version(scope),
+        replica_position(),
+        settings.POSTS_PAGINATION,
+        request.GET.get('page'),
+        request.GET.get('cursor'),
+        *vary_on,
+    ]
+    return {
+        'feed_cache_key': ':'.join(map(str, key)),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def _digest(*parts):
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def validators(scopes, *vary_on):
+    """ETag и функция времени последнего изменения для условного ответа.
+
+    ETag собирается из версий областей и параметров ответа,
+    Last-Modified — из времени их сброса. Страница с реплики не новее
+    её синхронизации: иначе после догона реплики клиент получил бы 304
+    на копию, прочитанную до него.
+    """
+    state = [*scopes, *map(get_version, scopes), replica_position()]
+
+    def last_modified():
+        timestamp = modified(scopes)
+        synced_at = replica_synced_at()
+        if synced_at is not None:
+            timestamp = min(timestamp, synced_at)
+        return timestamp
+
+    return _digest(*state, *vary_on), last_modified
@@ -0,0 +1,44 @@
+"""Кэш подписок читателя.
+
+Множество авторов, на которых подписан пользователь, хранится в кэше
+отсортированным массивом id: 4 байта на автора, проверка подписки —
+двоичный поиск без запроса к базе. Подписка и отписка сбрасывают массив
+сигналами Follow, следующее чтение собирает его заново одним запросом.
+Массив нужен только для показа: подписка и отписка пишут в базу, не
+сверяясь с ним, потому что кэш другого воркера может отставать.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Follow
+
+KEY = 'posts:follows:{}'
+# Беззнаковые 32 бита: столько вмещает AutoField
+TYPECODE = 'I'
+
+
+def author_ids(user_id):
+    """Отсортированный array id авторов из подписок пользователя."""
+    key = KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        # С основной базы: отстающая реплика попала бы в кэш надолго
+        follows = Follow.objects.using(DEFAULT_DB_ALIAS).filter(
+            user_id=user_id).order_by('author_id')
+        ids = array(TYPECODE, follows.values_list('author_id', flat=True))
+        cache.set(key, ids, settings.FOLLOWS_CACHE_TIMEOUT)
+    return ids
+
+
+def is_following(user_id, author_id):
+    ids = author_ids(user_id)
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def forget(user_id):
+    cache.delete(KEY.format(user_id))
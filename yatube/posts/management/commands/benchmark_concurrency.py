@@ -0,0 +1,180 @@
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment)
+from django.urls import reverse
+
+from core.db import private_cache, temporary_database
+from core.profiling import percentile
+from posts import seed
+from posts.models import Post
+
+# Настройки соединения: из settings и как у Django по умолчанию
+PROFILES = {
+    'tuned': lambda: settings.DATABASES['default']['OPTIONS'],
+    'default': lambda: {},
+}
+
+
+class Phase:
+    """Счётчики одной фазы замера, общие для потоков."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reads = []
+        self.writes = []
+        self.errors = Counter()
+
+    def add(self, kind, elapsed):
+        with self.lock:
+            getattr(self, kind).append(elapsed)
+
+    def error(self, error):
+        with self.lock:
+            self.errors[str(error)] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет чтение страниц во время всплесков записи (post_create и '
+        'add_comment) в потоках на отдельной базе: с настройками SQLite '
+        'из settings и с настройками Django по умолчанию'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Секунд на каждую фазу')
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES,
+                            default=list(PROFILES))
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write('Замер имеет смысл только для SQLite')
+            return
+        setup_test_environment()
+        # Ошибки записи идут в отчёт, а не трассировками в консоль
+        logger = logging.getLogger('django.request')
+        logger.disabled = True
+        settings_dict = connection.settings_dict
+        saved = settings_dict['OPTIONS']
+        try:
+            for profile in options['profiles']:
+                # settings_dict общий у соединений всех потоков
+                connection.close()
+                settings_dict['OPTIONS'] = PROFILES[profile]()
+                with temporary_database(), private_cache():
+                    self.run_profile(profile, options)
+        finally:
+            settings_dict['OPTIONS'] = saved
+            logger.disabled = False
+            teardown_test_environment()
+
+    def run_profile(self, profile, options):
+        objects = seed.seed(options['posts'], random_seed=options['seed'])
+        mode = connection.cursor().execute(
+            'PRAGMA journal_mode').fetchone()[0]
+        self.stdout.write(f'{profile} (journal_mode={mode}):')
+        self.urls = [reverse('posts:index')]
+        self.urls += [
+            reverse('posts:post_detail', kwargs={'post_id': pk})
+            for pk in Post.objects.order_by('-pk').values_list(
+                'pk', flat=True)[:50]
+        ]
+        self.urls.append(reverse(
+            'posts:profile',
+            kwargs={'username': objects['author'].username}))
+        self.post_id = objects['post'].pk
+        self.writers = []
+        for number in range(options['writers']):
+            client = Client()
+            client.force_login(objects['reader'])
+            self.writers.append(client)
+        for name, writers in (('только чтение', 0),
+                              ('чтение и запись', options['writers'])):
+            phase = self.run_phase(options, writers)
+            self.report(name, phase, options['duration'])
+
+    def run_phase(self, options, writers):
+        phase = Phase()
+        deadline = time.monotonic() + options['duration']
+        threads = [
+            threading.Thread(
+                target=self.read, args=(phase, deadline, number))
+            for number in range(options['readers'])
+        ] + [
+            threading.Thread(
+                target=self.write, args=(phase, deadline, self.writers[n]))
+            for n in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return phase
+
+    def read(self, phase, deadline, number):
+        rng = random.Random(number)
+        client = Client()
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    client.get(rng.choice(self.urls))
+                except OperationalError as error:
+                    phase.error(error)
+                    continue
+                phase.add('reads', time.perf_counter() - start)
+        finally:
+            connections.close_all()
+
+    def write(self, phase, deadline, client):
+        create = reverse('posts:post_create')
+        comment = reverse(
+            'posts:add_comment', kwargs={'post_id': self.post_id})
+        number = 0
+        try:
+            while time.monotonic() < deadline:
+                number += 1
+                start = time.perf_counter()
+                try:
+                    if number % 2:
+                        client.post(create, {'text': f'Пост {number}'})
+                    else:
+                        client.post(comment, {'text': f'Ответ {number}'})
+                except OperationalError as error:
+                    phase.error(error)
+                    continue
+                phase.add('writes', time.perf_counter() - start)
+        finally:
+            connections.close_all()
+
+    def report(self, name, phase, duration):
+        line = f'  {name}: чтений {len(phase.reads) / duration:.0f}/с'
+        if phase.reads:
+            line += (
+                f', p50 {statistics.median(phase.reads) * 1000:.1f} мс, '
+                f'p95 {percentile(phase.reads, 0.95) * 1000:.1f} мс'
+            )
+        if phase.writes:
+            line += (
+                f'; записей {len(phase.writes) / duration:.0f}/с, '
+                f'p95 {percentile(phase.writes, 0.95) * 1000:.1f} мс'
+            )
+        errors = sum(phase.errors.values())
+        line += f'; ошибок {errors}'
+        self.stdout.write(line)
+        for error, count in phase.errors.most_common():
+            self.stdout.write(f'    {error}: {count}')
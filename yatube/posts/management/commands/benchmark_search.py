@@ -0,0 +1,132 @@
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import seed
+from posts.search import (
+    COMMENTS_RANK, COMMENTS_TABLE, COUNT_SQL, CREATE_COMMENTS_TABLE,
+    CREATE_TABLE, RANK, RANKED_SQL, TABLE, match_query)
+
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(seed.word(rng))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время поиска FTS5 на синтетических постах '
+        'в отдельном временном файле базы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--words', type=int, default=30,
+                            help='Слов в посте')
+        parser.add_argument('--queries', type=int, default=100,
+                            help='Запросов каждого вида')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = vocabulary(20000, rng)
+        # Иначе частые слова были бы соседями по алфавиту с общим префиксом
+        rng.shuffle(words)
+        # Частоты слов по закону Ципфа, как в живом тексте
+        weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(words) + 1)))
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        try:
+            db = sqlite3.connect(path)
+            self.fill(db, options, rng, words, weights)
+            self.measure(db, options, rng, words)
+            db.close()
+        finally:
+            os.remove(path)
+
+    def fill(self, db, options, rng, words, weights):
+        for table, create, rank in (
+                (TABLE, CREATE_TABLE, RANK),
+                (COMMENTS_TABLE, CREATE_COMMENTS_TABLE, COMMENTS_RANK)):
+            db.execute(create)
+            db.execute(
+                f'INSERT INTO {table}({table}, rank) VALUES (?, ?)',
+                ['rank', rank]
+            )
+        groups = [' '.join(rng.choices(words, k=2)) for _ in range(100)]
+        start = time.monotonic()
+        batch = 10000
+        for first in range(0, options['posts'], batch):
+            ids = range(first + 1, min(first + batch, options['posts']) + 1)
+            db.executemany(
+                f'INSERT INTO {TABLE}(rowid, text, group_title) '
+                'VALUES (?, ?, ?)',
+                [
+                    (
+                        pk,
+                        ' '.join(rng.choices(
+                            words, cum_weights=weights, k=options['words'])),
+                        rng.choice(groups),
+                    )
+                    for pk in ids
+                ]
+            )
+            # По комментарию на пост, своей строкой, как в индексе сайта
+            db.executemany(
+                f'INSERT INTO {COMMENTS_TABLE}(rowid, text, post_id) '
+                'VALUES (?, ?, ?)',
+                [
+                    (
+                        pk,
+                        ' '.join(rng.choices(
+                            words, cum_weights=weights, k=10)),
+                        pk,
+                    )
+                    for pk in ids
+                ]
+            )
+        for table in (TABLE, COMMENTS_TABLE):
+            db.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+        db.commit()
+        self.stdout.write(
+            f'Проиндексировано постов: {options["posts"]} '
+            f'за {time.monotonic() - start:.1f} с'
+        )
+
+    def measure(self, db, options, rng, words):
+        kinds = {
+            'частое слово': lambda: rng.choice(words[:20]),
+            'среднее слово': lambda: rng.choice(words[200:2000]),
+            'редкое слово': lambda: rng.choice(words[10000:]),
+            'два слова': lambda: ' '.join(rng.sample(words[:2000], 2)),
+        }
+        counted = COUNT_SQL.replace('%s', '?')
+        ranked = RANKED_SQL.replace('%s', '?')
+        for kind, make_query in kinds.items():
+            timings = []
+            found = []
+            for _ in range(options['queries']):
+                match = match_query(make_query())
+                # Как SQLiteFTSBackend: число найденных и первая страница
+                start = time.monotonic()
+                found.append(
+                    db.execute(counted, [match, match]).fetchone()[0])
+                db.execute(
+                    f'{ranked} LIMIT 10', [match, match]).fetchall()
+                timings.append((time.monotonic() - start) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(
+                f'{kind}: найдено в среднем {statistics.mean(found):.0f}, '
+                f'p50 {statistics.median(timings):.1f} мс, '
+                f'p95 {p95:.1f} мс, max {timings[-1]:.1f} мс'
+            )
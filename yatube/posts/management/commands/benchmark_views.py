@@ -0,0 +1,158 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment)
+from django.urls import reverse
+
+from core.db import private_cache, temporary_database
+from core.profiling import percentile
+from posts import seed
+
+METRICS = ('cold_ms', 'p50_ms', 'p95_ms', 'queries_cold', 'queries',
+           'peak_kb', 'bytes')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время, число запросов и память основных страниц на '
+        'сгенерированных данных в отдельной тестовой базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, nargs='+', default=[10000],
+                            help='Размеры данных, например 10000 100000')
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Повторных запросов каждой страницы')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument('--compare',
+                            help='Сравнить с сохранёнными результатами')
+        parser.add_argument('--threshold', type=float, default=20,
+                            help='Допустимый рост времени, процентов')
+
+    def handle(self, *args, **options):
+        results = {
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'sizes': {},
+        }
+        setup_test_environment()
+        try:
+            for posts in options['posts']:
+                results['sizes'][str(posts)] = self.run_size(posts, options)
+        finally:
+            teardown_test_environment()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(results, stream, indent=2, sort_keys=True)
+                stream.write('\n')
+        if options['compare']:
+            self.compare(options['compare'], results, options['threshold'])
+
+    def run_size(self, posts, options):
+        with temporary_database(), private_cache():
+            started = time.monotonic()
+            objects = seed.seed(posts, random_seed=options['seed'])
+            self.stdout.write(
+                f'{posts} постов: данные созданы за '
+                f'{time.monotonic() - started:.0f} с'
+            )
+            return self.measure_views(objects, options['requests'])
+
+    def measure_views(self, objects, requests):
+        guest = Client()
+        reader = Client()
+        reader.force_login(objects['reader'])
+        word = objects['post'].text.split()[0]
+        pages = {
+            'index': (guest, reverse('posts:index')),
+            'index_auth': (reader, reverse('posts:index')),
+            'group_list': (guest, reverse(
+                'posts:group_list', kwargs={'slug': objects['group'].slug})),
+            'profile': (guest, reverse(
+                'posts:profile',
+                kwargs={'username': objects['author'].username})),
+            'follow_index': (reader, reverse('posts:follow_index')),
+            'post_detail': (guest, reverse(
+                'posts:post_detail',
+                kwargs={'post_id': objects['post'].pk})),
+            'search': (guest, reverse('posts:search') + f'?q={word}'),
+        }
+        results = {}
+        for name, (client, url) in pages.items():
+            results[name] = self.measure(client, url, requests)
+            self.stdout.write('  {:<13}'.format(name) + '  '.join(
+                f'{metric} {results[name][metric]}' for metric in METRICS))
+        return results
+
+    def request(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+        return elapsed, len(queries), len(response.content)
+
+    def measure(self, client, url, requests):
+        cache.clear()
+        cold_ms, queries_cold, size = self.request(client, url)
+        timings = []
+        queries = queries_cold
+        for _ in range(requests):
+            elapsed, queries, _ = self.request(client, url)
+            timings.append(elapsed)
+        # Пик памяти холодного запроса; tracemalloc замедляет его,
+        # поэтому время выше меряется без него
+        cache.clear()
+        tracemalloc.start()
+        self.request(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'cold_ms': round(cold_ms, 1),
+            'p50_ms': round(statistics.median(timings or [cold_ms]), 1),
+            'p95_ms': round(percentile(timings or [cold_ms], 0.95), 1),
+            'queries_cold': queries_cold,
+            'queries': queries,
+            'peak_kb': peak // 1024,
+            'bytes': size,
+        }
+
+    def compare(self, path, results, threshold):
+        with open(path, encoding='utf-8') as stream:
+            previous = json.load(stream)
+        regressions = []
+        for size, views in results['sizes'].items():
+            for name, current in views.items():
+                before = previous['sizes'].get(size, {}).get(name)
+                if before is None:
+                    continue
+                if current['queries'] > before['queries']:
+                    regressions.append(
+                        f'{size} {name}: запросов {before["queries"]} -> '
+                        f'{current["queries"]}'
+                    )
+                limit = before['p50_ms'] * (1 + threshold / 100)
+                if current['p50_ms'] > limit:
+                    regressions.append(
+                        f'{size} {name}: p50 {before["p50_ms"]} -> '
+                        f'{current["p50_ms"]} мс'
+                    )
+        for regression in regressions:
+            self.stdout.write(regression)
+        if regressions:
+            raise CommandError(f'Регрессий: {len(regressions)}')
+        self.stdout.write('Регрессий нет')
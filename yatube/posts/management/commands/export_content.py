@@ -0,0 +1,133 @@
+import csv
+import datetime
+import gzip
+import json
+import os
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+from posts.models import Comment, Follow, Group, Post
+
+FORMATS = ('jsonl', 'csv')
+# Поля выгрузки; посты выгружаются в формате import_posts
+FIELDS = {
+    'groups': ('id', 'slug', 'title', 'description'),
+    'posts': ('id', 'text', 'author', 'group', 'pub_date', 'image'),
+    'comments': ('id', 'post', 'author', 'text', 'created'),
+    'follows': ('user', 'author'),
+}
+COLUMNS = {
+    'groups': ('pk', 'slug', 'title', 'description'),
+    'posts': (
+        'pk', 'text', 'author__username', 'group__slug', 'pub_date', 'image'),
+    'comments': ('pk', 'post_id', 'author__username', 'text', 'created'),
+    'follows': ('user__username', 'author__username'),
+}
+
+
+def date_argument(value):
+    """Дата или дата и время из командной строки."""
+    date = parse_datetime(value)
+    if date is not None:
+        return date
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return datetime.datetime.combine(day, datetime.time.min)
+
+
+def to_text(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии и подписки в JSON Lines или '
+        'сжатый CSV, по файлу на вид данных, не загружая их в память'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для файлов выгрузки')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжимать файлы; для CSV всегда включено')
+        parser.add_argument('--only', nargs='+', choices=FIELDS,
+                            default=list(FIELDS), help='Что выгружать')
+        parser.add_argument('--since', type=date_argument,
+                            help='Посты и комментарии начиная с даты')
+        parser.add_argument('--until', type=date_argument,
+                            help='Посты и комментарии до даты, не включая')
+        parser.add_argument('--author', nargs='+',
+                            help='Только эти авторы (username)')
+        parser.add_argument('--group', nargs='+',
+                            help='Только эти группы (slug)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        os.makedirs(directory, exist_ok=True)
+        format = options['format']
+        compress = options['gzip'] or format == 'csv'
+        querysets = self.querysets(options)
+        for kind in options['only']:
+            name = f'{kind}.{format}' + ('.gz' if compress else '')
+            path = os.path.join(directory, name)
+            rows = querysets[kind].values_list(*COLUMNS[kind]).order_by(
+                'pk').iterator(chunk_size=options['chunk_size'])
+            count = self.write(path, format, compress, FIELDS[kind], rows)
+            self.stdout.write(f'{name}: {count}')
+
+    def querysets(self, options):
+        posts = Post.objects.all()
+        comments = Comment.objects.all()
+        follows = Follow.objects.all()
+        groups = Group.objects.all()
+        if options['since']:
+            posts = posts.filter(pub_date__gte=options['since'])
+            comments = comments.filter(created__gte=options['since'])
+        if options['until']:
+            posts = posts.filter(pub_date__lt=options['until'])
+            comments = comments.filter(created__lt=options['until'])
+        if options['author']:
+            authors = options['author']
+            posts = posts.filter(author__username__in=authors)
+            comments = comments.filter(post__author__username__in=authors)
+            follows = follows.filter(
+                Q(user__username__in=authors)
+                | Q(author__username__in=authors)
+            )
+        if options['group']:
+            posts = posts.filter(group__slug__in=options['group'])
+            comments = comments.filter(post__group__slug__in=options['group'])
+            groups = groups.filter(slug__in=options['group'])
+        return {
+            'groups': groups,
+            'posts': posts,
+            'comments': comments,
+            'follows': follows,
+        }
+
+    def write(self, path, format, compress, fields, rows):
+        if compress:
+            stream = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        else:
+            stream = open(path, 'w', encoding='utf-8', newline='')
+        count = 0
+        with stream:
+            if format == 'csv':
+                writer = csv.writer(stream)
+                writer.writerow(fields)
+            for row in rows:
+                values = [to_text(value) for value in row]
+                if format == 'csv':
+                    writer.writerow(values)
+                else:
+                    stream.write(json.dumps(
+                        dict(zip(fields, values)), ensure_ascii=False))
+                    stream.write('\n')
+                count += 1
+        return count
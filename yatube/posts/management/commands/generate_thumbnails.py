@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры картинок постов'
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only('image', 'image_manifest')
+        created = 0
+        for post in posts.iterator():
+            if thumbnails.load_manifest(post) is None:
+                thumbnails.generate(post.pk)
+                created += 1
+        self.stdout.write(f'Создано миниатюр: {created}')
@@ -0,0 +1,16 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок (FeedEntry) для всех читателей'
+
+    def handle(self, *args, **options):
+        readers = User.objects.filter(follower__isnull=False).distinct()
+        for user in readers.iterator():
+            timeline.rebuild(user)
+        self.stdout.write(f'Пересобрано лент: {readers.count()}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import stats, timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики UserStats по исходным таблицам'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = stats.rebuild_all()
+            # Горячие авторы считаются по followers_count
+            timeline.forget_hot_authors()
+        self.stdout.write(f'Пересчитано пользователей: {total}')
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_manifest',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+CREATE_TABLE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5('
+    'text, group_title, comments, '
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '3 4')"
+)
+SET_RANK = (
+    "INSERT INTO posts_search(posts_search, rank) "
+    "VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')"
+)
+FILL = (
+    'INSERT INTO posts_search(rowid, text, group_title, comments) '
+    "SELECT p.id, p.text, COALESCE(g.title, ''), "
+    "COALESCE((SELECT group_concat(c.text, ' ') FROM posts_comment c "
+    "WHERE c.post_id = p.id), '') "
+    'FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id'
+)
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других базах работает LikeBackend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in (CREATE_TABLE, SET_RANK, FILL):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_manifest'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
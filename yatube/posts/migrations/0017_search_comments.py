@@ -0,0 +1,55 @@
+from importlib import import_module
+
+from django.db import migrations
+
+OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '3 4'"
+CREATE_POSTS = (
+    'CREATE VIRTUAL TABLE posts_search USING fts5('
+    f'text, group_title, {OPTIONS})'
+)
+CREATE_COMMENTS = (
+    'CREATE VIRTUAL TABLE posts_search_comments USING fts5('
+    f'text, post_id UNINDEXED, {OPTIONS})'
+)
+SET_RANKS = (
+    "INSERT INTO posts_search(posts_search, rank) "
+    "VALUES ('rank', 'bm25(10.0, 5.0)')",
+    "INSERT INTO posts_search_comments(posts_search_comments, rank) "
+    "VALUES ('rank', 'bm25(1.0, 0.0)')",
+)
+FILL = (
+    'INSERT INTO posts_search(rowid, text, group_title) '
+    "SELECT p.id, p.text, COALESCE(g.title, '') "
+    'FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id',
+    'INSERT INTO posts_search_comments(rowid, text, post_id) '
+    'SELECT c.id, c.text, c.post_id FROM posts_comment c',
+)
+
+
+def split_comments(apps, schema_editor):
+    # Комментарии переезжают из документа поста в свои строки
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+    for sql in (CREATE_POSTS, CREATE_COMMENTS, *SET_RANKS, *FILL):
+        schema_editor.execute(sql)
+
+
+def join_comments(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    previous = import_module('posts.migrations.0016_search_index')
+    for table in ('posts_search', 'posts_search_comments'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+    previous.create_search_index(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_comments, join_comments),
+    ]
@@ -15,6 +15,25 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Поля, которые выводят шаблоны ленты; остальное не тянем из базы
+    FEED_FIELDS = (
+        'text',
+        'pub_date',
+        'image',
+        'image_manifest',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+        'group__title',
+        'group__slug',
+    )
+
+    def feed(self):
+        """Посты для ленты: автор и группа одним JOIN, без лишних колонок."""
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+
 class Post(CreatedModel):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -40,11 +59,26 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )
+    # JSON от posts.thumbnails.generate: размеры, пути вариантов, хэш
+    image_manifest = models.TextField(blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты групп и авторов: фильтр по ключу и порядок (pub_date, id)
+        indexes = [
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text
@@ -53,7 +87,7 @@ class Post(CreatedModel):
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
-        on_delete=True,
+        on_delete=models.CASCADE,
         related_name='comments'
     )
     author = models.ForeignKey(
@@ -68,6 +102,15 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -90,3 +133,73 @@ class Follow(models.Model):
                 name='unique_following'
             )
         ]
+        # Подписчики автора; (user, author) покрыт ограничением выше
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Пост в ленте подписок читателя, разложенный при публикации."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Читатель',
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    # Копия Post.pub_date: лента читается по индексу без сортировки
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feedentry_user_pub_date_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы считать COUNT(*)."""
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+        indexes = [
+            # Горячие авторы ленты подписок (posts/timeline.py)
+            models.Index(
+                fields=['followers_count'],
+                name='userstats_followers_idx'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return str(self.user)
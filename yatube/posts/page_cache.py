@@ -0,0 +1,100 @@
+"""Кэш целых страниц лент с «дырками» под данные пользователя.
+
+Включается FULL_PAGE_CACHE. Лента (index, group_posts) помечает запрос
+через share(): шапка и переключатель лент тогда выводятся тегом
+{% hole %} не сами, а заглушкой — ESI или блоком, который скрипт из
+base.html подгружает с /fragments/<имя>/. Остальная страница от
+пользователя не зависит, и PageCacheMiddleware сохраняет готовый ответ
+вместе с версиями лент. Следующий GET того же адреса отдаётся из кэша
+до сессий, аутентификации и рендера, пока версии не изменились.
+
+Без куки сессии посетитель точно гость, поэтому у страницы два
+варианта (variant()): гостю шапка и переключатель выводятся сразу, без
+запросов за фрагментами, а дырки остаются только для запросов с кукой.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from core.routers import replica_position
+
+from . import feed_cache
+
+KEY = 'posts:page:{}'
+HOLES = {
+    'header': 'includes/header.html',
+    'switcher': 'posts/includes/switcher.html',
+}
+
+
+def variant(request):
+    """'guest' без куки сессии, иначе 'holes'."""
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return 'holes'
+    return 'guest'
+
+
+def page_key(request):
+    query = sorted(request.GET.lists())
+    return KEY.format(hashlib.md5(
+        f'{variant(request)}:{request.path}?{query}'.encode()).hexdigest())
+
+
+def share(request, scopes):
+    """Отмечает страницу как общую для всех, если кэш страниц включён."""
+    # Страница с реплики отстаёт от версий, под которыми легла бы в кэш
+    if (not getattr(request, 'page_cacheable', False)
+            or replica_position() is not None):
+        return False
+    request.page_cache_versions = {
+        scope: feed_cache.get_version(scope) for scope in scopes}
+    return True
+
+
+def is_shared(request):
+    return hasattr(request, 'page_cache_versions')
+
+
+def _fresh(entry):
+    return all(
+        feed_cache.get_version(scope) == version
+        for scope, version in entry['versions'].items()
+    )
+
+
+class PageCacheMiddleware:
+    """Отдаёт сохранённые общие страницы; ставится до SessionMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.FULL_PAGE_CACHE or request.method != 'GET':
+            return self.get_response(request)
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None and _fresh(entry):
+            return self.cached_response(request, entry['response'])
+        request.page_cacheable = True
+        response = self.get_response(request)
+        # Ответ с куками (сессия, CSRF, сообщения) принадлежит одному
+        # пользователю и в общий кэш не попадает
+        if (is_shared(request) and response.status_code == 200
+                and not response.cookies):
+            cache.set(key, {
+                'versions': request.page_cache_versions,
+                'response': response,
+            }, settings.FEED_CACHE_TIMEOUT)
+        return response
+
+    def cached_response(self, request, response):
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(
+                response.get('Last-Modified', '')),
+            response=response,
+        )
@@ -0,0 +1,132 @@
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'posts.pagination.cursor'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(date, pk, direction):
+    """Упаковывает ключ (дата, id) в непрозрачную строку."""
+    return signing.dumps(
+        [direction, date.isoformat(), pk],
+        salt=CURSOR_SALT
+    )
+
+
+def decode_cursor(cursor):
+    """Возвращает (direction, дата, id) или None для битого курсора."""
+    try:
+        direction, date, pk = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    date = parse_datetime(date)
+    if direction not in (NEXT, PREVIOUS) or date is None:
+        return None
+    return direction, date, pk
+
+
+def ordering_field(key):
+    """(поле, по убыванию) из '-pub_date' или F('pub_date').desc()."""
+    if isinstance(key, str):
+        return key.lstrip('-'), key.startswith('-')
+    return key.expression.name, key.descending
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (дата, id) без COUNT(*) и OFFSET.
+
+    По умолчанию это (pub_date, id) от новых к старым; явный order_by
+    из двух полей задаёт другой ключ и направление. Страница всегда
+    строится одним запросом с LIMIT per_page + 1, поэтому время ответа
+    не зависит от глубины. Общее число страниц неизвестно: number и
+    num_pages подбираются так, чтобы has_next/has_previous у обычного
+    Page работали как ожидается.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, per_page, cursor=None):
+        ordering = object_list.query.order_by
+        if len(ordering) != 2:
+            ordering = ('-pub_date', '-pk')
+        (self.date_key, self.descending), (self.pk_key, _) = map(
+            ordering_field, ordering)
+        if LOOKUP_SEP in self.date_key + self.pk_key:
+            # Отдельный filter() по связанной таблице добавил бы второй
+            # JOIN, а аннотации ссылаются на уже существующий.
+            object_list = object_list.annotate(
+                keyset_date=F(self.date_key), keyset_pk=F(self.pk_key))
+            self.date_key, self.pk_key = 'keyset_date', 'keyset_pk'
+        sign = '-' if self.descending else ''
+        super().__init__(
+            object_list.order_by(
+                sign + self.date_key, sign + self.pk_key),
+            per_page
+        )
+        self.cursor = decode_cursor(cursor) if cursor else None
+        self._has_next = False
+        self._has_previous = False
+
+    @cached_property
+    def num_pages(self):
+        return self.page().number + int(self._has_next)
+
+    def get_page(self, number=None):
+        return self.page()
+
+    def validate_number(self, number):
+        return number
+
+    def _after(self, date, pk, forward):
+        lookup = 'lt' if forward == self.descending else 'gt'
+        return (
+            Q(**{f'{self.date_key}__{lookup}': date})
+            | Q(**{self.date_key: date, f'{self.pk_key}__{lookup}': pk})
+        )
+
+    def _cursor(self, obj, direction):
+        return encode_cursor(
+            getattr(obj, self.date_key), getattr(obj, self.pk_key),
+            direction
+        )
+
+    @cached_property
+    def _page(self):
+        queryset = self.object_list
+        limit = self.per_page + 1
+        if self.cursor is None:
+            objects = list(queryset[:limit])
+            self._has_next = len(objects) > self.per_page
+            objects = objects[:self.per_page]
+        else:
+            direction, date, pk = self.cursor
+            if direction == NEXT:
+                objects = list(queryset.filter(
+                    self._after(date, pk, forward=True))[:limit])
+                self._has_next = len(objects) > self.per_page
+                self._has_previous = True
+                objects = objects[:self.per_page]
+            else:
+                objects = list(queryset.filter(
+                    self._after(date, pk, forward=False)
+                ).reverse()[:limit])
+                self._has_previous = len(objects) > self.per_page
+                self._has_next = True
+                objects = objects[:self.per_page][::-1]
+        page = Page(objects, 1 + int(self._has_previous), self)
+        page.next_cursor = (
+            self._cursor(objects[-1], NEXT)
+            if self._has_next and objects else None
+        )
+        page.previous_cursor = (
+            self._cursor(objects[0], PREVIOUS)
+            if self._has_previous and objects else None
+        )
+        return page
+
+    def page(self, number=None):
+        return self._page
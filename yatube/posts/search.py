@@ -0,0 +1,246 @@
+"""Полнотекстовый поиск по постам.
+
+Пост находится по своему тексту, названию группы или тексту одного из
+комментариев. Бэкенд выбирается настройкой SEARCH_BACKEND:
+
+* SQLiteFTSBackend — инвертированные индексы FTS5: posts_search с
+  текстом и группой поста (rowid = id поста) и posts_search_comments с
+  комментариями (rowid = id комментария). Комментарий — своя строка
+  индекса, и его сохранение не пересобирает документ поста. Все слова
+  запроса должны найтись в одном документе: в посте или в одном
+  комментарии. Ранжирование bm25 по всем совпадениям;
+* LikeBackend — LIKE по исходным таблицам для баз без FTS5, без индекса
+  и без ранжирования, самые новые посты первыми.
+
+Индекс обновляют сигналы сохранения и удаления постов, комментариев и
+групп в той же транзакции; rebuild_search_index пересобирает его целиком.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Comment, Group, Post
+
+TABLE = 'posts_search'
+COMMENTS_TABLE = 'posts_search_comments'
+# Веса bm25 для колонок text, group_title поста
+RANK = 'bm25(10.0, 5.0)'
+# Вес текста комментария; post_id не индексируется
+COMMENTS_RANK = 'bm25(1.0, 0.0)'
+PREFIX_MIN_LENGTH = 3
+# Схема индекса, как в миграции 0017; префиксные индексы на 3 и 4 буквы
+# избавляют короткие префиксы от слияния тысяч списков
+OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '3 4'"
+CREATE_TABLE = (
+    f'CREATE VIRTUAL TABLE {TABLE} USING fts5(text, group_title, {OPTIONS})'
+)
+CREATE_COMMENTS_TABLE = (
+    f'CREATE VIRTUAL TABLE {COMMENTS_TABLE} USING fts5('
+    f'text, post_id UNINDEXED, {OPTIONS})'
+)
+# Совпадения постов и комментариев: (post_id, rank), оба MATCH — %s
+MATCHES_SQL = (
+    f'SELECT rowid AS post_id, rank FROM {TABLE} '
+    f'WHERE {TABLE} MATCH %s '
+    f'UNION ALL SELECT post_id, rank FROM {COMMENTS_TABLE} '
+    f'WHERE {COMMENTS_TABLE} MATCH %s'
+)
+# Пост со словом в нескольких комментариях встречается один раз,
+# на месте своего лучшего совпадения
+RANKED_SQL = (
+    f'SELECT post_id FROM ({MATCHES_SQL}) GROUP BY post_id '
+    'ORDER BY MIN(rank), post_id DESC'
+)
+COUNT_SQL = f'SELECT COUNT(DISTINCT post_id) FROM ({MATCHES_SQL})'
+INSERTS = {
+    TABLE: f'INSERT INTO {TABLE}(rowid, text, group_title) ',
+    COMMENTS_TABLE: f'INSERT INTO {COMMENTS_TABLE}(rowid, text, post_id) ',
+}
+WORD_RE = re.compile(r'\w+')
+
+
+def match_query(query):
+    """Запрос FTS5 из пользовательской строки: все слова сразу.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 (AND, NEAR,
+    двоеточия, звёздочки) из ввода не выполняются. Последнее слово
+    ищется по префиксу, если оно не короче PREFIX_MIN_LENGTH.
+    """
+    words = [f'"{word}"' for word in WORD_RE.findall(query.lower())]
+    if words and len(words[-1]) - 2 >= PREFIX_MIN_LENGTH:
+        words[-1] += '*'
+    return ' '.join(words)
+
+
+def documents_sql(id_in=''):
+    """SELECT id, текст, группа постов; id_in — условие на id: 'IN (...)'."""
+    post = Post._meta.db_table
+    group = Group._meta.db_table
+    where = f'WHERE p.id {id_in}' if id_in else ''
+    return (
+        f'SELECT p.id, p.text, COALESCE(g.title, \'\') '
+        f'FROM {post} p LEFT JOIN {group} g ON g.id = p.group_id {where}'
+    )
+
+
+def comments_sql(id_in=''):
+    """SELECT id, текст, id поста комментариев; id_in — как у постов."""
+    where = f'WHERE c.id {id_in}' if id_in else ''
+    return (
+        f'SELECT c.id, c.text, c.post_id '
+        f'FROM {Comment._meta.db_table} c {where}'
+    )
+
+
+class SearchResults:
+    """Ленивый результат поиска для Paginator: count() и срезы.
+
+    Срез запрашивает у бэкенда только id своей страницы и догружает
+    посты одним запросом, сохраняя порядок по релевантности.
+    """
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+
+    def count(self):
+        if not hasattr(self, '_count'):
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        ids = self.backend.post_ids(self.query, start, index.stop - start)
+        posts = Post.objects.feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+class BaseSearchBackend:
+    def index_posts(self, post_ids):
+        pass
+
+    def remove_posts(self, post_ids):
+        pass
+
+    def index_comments(self, comment_ids):
+        pass
+
+    def remove_comments(self, comment_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def post_ids(self, query, offset, limit):
+        raise NotImplementedError
+
+    def search(self, query):
+        return SearchResults(self, query)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    def _reader(self):
+        # Та же база, из которой SearchResults догрузит посты: иначе с
+        # отстающей реплики пропали бы найденные на основной
+        return connections[router.db_for_read(Post)].cursor()
+
+    def _index(self, table, select, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE rowid IN ({placeholders})', ids)
+            cursor.execute(
+                INSERTS[table] + select(f'IN ({placeholders})'), ids)
+
+    def _remove(self, table, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE rowid IN ({placeholders})', ids)
+
+    def index_posts(self, post_ids):
+        self._index(TABLE, documents_sql, post_ids)
+
+    def remove_posts(self, post_ids):
+        self._remove(TABLE, post_ids)
+
+    def index_comments(self, comment_ids):
+        self._index(COMMENTS_TABLE, comments_sql, comment_ids)
+
+    def remove_comments(self, comment_ids):
+        self._remove(COMMENTS_TABLE, comment_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            for table, select in ((TABLE, documents_sql),
+                                  (COMMENTS_TABLE, comments_sql)):
+                cursor.execute(f'DELETE FROM {table}')
+                cursor.execute(INSERTS[table] + select())
+                cursor.execute(
+                    f'INSERT INTO {table}({table}) VALUES (%s)', ['optimize'])
+
+    def count(self, query):
+        match = match_query(query)
+        if not match:
+            return 0
+        with self._reader() as cursor:
+            cursor.execute(COUNT_SQL, [match, match])
+            return cursor.fetchone()[0]
+
+    def post_ids(self, query, offset, limit):
+        match = match_query(query)
+        if not match:
+            return []
+        with self._reader() as cursor:
+            cursor.execute(
+                f'{RANKED_SQL} LIMIT %s OFFSET %s',
+                [match, match, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class LikeBackend(BaseSearchBackend):
+    def _filter(self, query):
+        condition = Q()
+        for word in WORD_RE.findall(query):
+            condition &= (
+                Q(text__icontains=word)
+                | Q(group__title__icontains=word)
+                | Q(comments__text__icontains=word)
+            )
+        if not condition:
+            return Post.objects.none()
+        return Post.objects.filter(condition).values('pk').distinct()
+
+    def count(self, query):
+        return self._filter(query).count()
+
+    def post_ids(self, query, offset, limit):
+        posts = self._filter(query).order_by('-pub_date', '-pk')
+        return list(
+            posts.values_list('pk', flat=True)[offset:offset + limit])
+
+
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+def search(query):
+    return get_backend().search(query)
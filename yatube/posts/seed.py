@@ -0,0 +1,192 @@
+"""Детерминированный генератор данных для замеров и бюджетов.
+
+seed() наполняет базу пользователями, группами, постами, комментариями
+и подписками через bulk_create. Одинаковые размеры и зерно дают одни и
+те же данные, поэтому замеры разных версий сравнимы. Популярность
+авторов распределена по закону Ципфа: немногие авторы собирают
+большинство подписчиков, постов и комментариев, как в живой сети.
+"""
+import datetime
+import itertools
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+
+from core.db import keep_auto_now
+
+from . import search, stats, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH = 5000
+START = datetime.datetime(2020, 1, 1)
+SYLLABLES = (
+    'ка', 'ло', 'ми', 'ре', 'то', 'на', 'су', 'ви', 'ем', 'ор',
+    'ба', 'ги', 'ду', 'жа', 'зо', 'пе', 'ры', 'ст', 'фу', 'ще',
+)
+
+
+def word(rng):
+    """Псевдослово из 2–4 слогов SYLLABLES."""
+    return ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+
+
+def zipf_weights(size, exponent=1.0):
+    """Накопленные веса для random.choices(cum_weights=...)."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def batches(iterable, size=BATCH):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def new_ids(model, last_pk):
+    return list(
+        model.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+            'pk', flat=True))
+
+
+def last_pk(model):
+    return model.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+
+
+class Seeder:
+    def __init__(self, posts, users, groups, comments, follows, seed):
+        self.rng = random.Random(seed)
+        self.sizes = {
+            'posts': posts,
+            'users': users,
+            'groups': groups,
+            'comments': comments,
+            'follows': follows,
+        }
+        self.words = sorted({word(self.rng) for _ in range(5000)})
+        self.word_weights = zipf_weights(len(self.words))
+
+    def text(self, words):
+        return ' '.join(self.rng.choices(
+            self.words, cum_weights=self.word_weights, k=words))
+
+    def create(self, model, objects):
+        first = last_pk(model)
+        for batch in batches(objects):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+        return new_ids(model, first)
+
+    def run(self):
+        sizes = self.sizes
+        # Пароль у всех один: хэширование на каждого заняло бы минуты
+        password = make_password(None)
+        self.users = self.create(User, (
+            User(username=f'user{number}', password=password)
+            for number in range(sizes['users'])
+        ))
+        self.groups = self.create(Group, (
+            Group(
+                title=f'Группа {number}', slug=f'group-{number}',
+                description=self.text(10)
+            )
+            for number in range(sizes['groups'])
+        ))
+        # Ранг популярности: users[0] — самый читаемый и плодовитый автор
+        self.user_weights = zipf_weights(len(self.users))
+        with keep_auto_now(Post, 'pub_date'):
+            self.posts = self.create(Post, self.make_posts())
+        with keep_auto_now(Comment, 'created'):
+            self.create(Comment, self.make_comments())
+        self.create(Follow, self.make_follows())
+
+    def make_posts(self):
+        minutes = max(365 * 24 * 60 // max(self.sizes['posts'], 1), 1)
+        for number in range(self.sizes['posts']):
+            group = (
+                self.rng.choice(self.groups)
+                if self.groups and self.rng.random() < 0.7 else None
+            )
+            yield Post(
+                text=self.text(self.rng.randint(5, 60)),
+                author_id=self.pick_user(),
+                group_id=group,
+                pub_date=START + datetime.timedelta(minutes=number * minutes),
+            )
+
+    def make_comments(self):
+        if not self.posts:
+            return
+        post_weights = zipf_weights(len(self.posts))
+        # Свежие посты обсуждают чаще старых
+        posts = self.posts[::-1]
+        for number in range(self.sizes['comments']):
+            yield Comment(
+                post_id=self.rng.choices(posts, cum_weights=post_weights)[0],
+                author_id=self.pick_user(),
+                text=self.text(self.rng.randint(3, 30)),
+                created=START + datetime.timedelta(seconds=number),
+            )
+
+    def make_follows(self):
+        average = self.sizes['follows'] / max(len(self.users), 1)
+        for user in self.users:
+            count = min(
+                int(self.rng.expovariate(1 / average)) if average else 0,
+                len(self.users) - 1
+            )
+            authors = set()
+            # Подписка на популярных вероятнее: входящая степень по Ципфу
+            while len(authors) < count:
+                author = self.pick_user()
+                if author != user:
+                    authors.add(author)
+            for author in sorted(authors):
+                yield Follow(user_id=user, author_id=author)
+
+    def pick_user(self):
+        return self.rng.choices(self.users, cum_weights=self.user_weights)[0]
+
+
+def seed(posts, users=None, groups=20, comments=None, follows=None,
+         random_seed=1):
+    """Наполняет базу и возвращает заметные объекты для замеров.
+
+    По умолчанию пользователей в 10 раз меньше, чем постов, комментариев
+    вдвое больше постов, в среднем 20 подписок на пользователя.
+    """
+    users = users or max(posts // 10, 2)
+    seeder = Seeder(
+        posts=posts,
+        users=users,
+        groups=groups,
+        comments=posts * 2 if comments is None else comments,
+        follows=users * 20 if follows is None else follows,
+        seed=random_seed,
+    )
+    seeder.run()
+    # Работа сигналов, которых bulk_create не отправляет
+    stats.rebuild_all()
+    search.get_backend().rebuild()
+    if timeline.is_enabled():
+        readers = User.objects.filter(follower__isnull=False).distinct()
+        for user in readers.iterator():
+            timeline.rebuild(user)
+    cache.clear()
+    return {
+        # Самый популярный автор, самый активный читатель, самый
+        # обсуждаемый (самый свежий) пост
+        'author': User.objects.get(pk=seeder.users[0]),
+        'reader': User.objects.order_by(
+            '-stats__following_count', 'pk').first(),
+        'group': Group.objects.filter(pk__in=seeder.groups[:1]).first(),
+        'post': Post.objects.filter(pk__in=seeder.posts[-1:]).first(),
+    }
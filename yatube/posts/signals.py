@@ -0,0 +1,187 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import feed_cache, follows, search, stats, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+COUNTERS = {
+    Post: 'posts_count',
+    Comment: 'comments_count',
+}
+# Поля автора, которые показываются в лентах и API
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_feeds(sender, instance, **kwargs):
+    feed_cache.bump_post(instance)
+
+
+def bump_posts(posts, *scopes):
+    """Сбрасывает все ленты, где показаны посты posts, и сами посты."""
+    posts = list(posts.values_list('pk', 'author_id', 'group_id'))
+    feed_cache.bump(
+        feed_cache.INDEX, *scopes,
+        *{feed_cache.author_scope(author_id) for _, author_id, _ in posts},
+        *{
+            feed_cache.group_scope(group_id)
+            for _, _, group_id in posts if group_id is not None
+        },
+        *(feed_cache.post_scope(pk) for pk, _, _ in posts),
+    )
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_feed(sender, instance, created, **kwargs):
+    # Название и slug группы есть и на главной, и в профилях авторов
+    if not created:
+        bump_posts(instance.posts.all(), feed_cache.group_scope(instance.pk))
+
+
+@receiver(pre_save, sender=User)
+def remember_author_name(sender, instance, using, update_fields=None,
+                         **kwargs):
+    instance.feed_names = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(NAME_FIELDS) & set(
+            update_fields):
+        return
+    instance.feed_names = User.objects.using(using).filter(
+        pk=instance.pk).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_feed(sender, instance, **kwargs):
+    names = tuple(getattr(instance, name) for name in NAME_FIELDS)
+    if instance.feed_names in (None, names):
+        return
+    bump_posts(
+        Post.objects.filter(
+            Q(author=instance) | Q(comments__author=instance)).distinct(),
+        feed_cache.author_scope(instance.pk),
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.follow_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def forget_follows(sender, instance, **kwargs):
+    follows.forget(instance.user_id)
+    # Параллельный запрос мог положить в кэш старый массив до коммита
+    transaction.on_commit(lambda: follows.forget(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created and timeline.is_enabled():
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created and timeline.is_enabled():
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    if timeline.is_enabled():
+        timeline.prune(instance.user, instance.author)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, COUNTERS[sender], 1)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def count_deleted(sender, instance, **kwargs):
+    stats.change(instance.author_id, COUNTERS[sender], -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, 'followers_count', 1)
+        stats.change(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, **kwargs):
+    stats.change(instance.author_id, 'followers_count', -1)
+    stats.change(instance.user_id, 'following_count', -1)
+
+
+# После счётчиков: порог раскладки проверяется по новому значению
+@receiver(post_save, sender=Follow)
+def check_hot_follow(sender, instance, created, **kwargs):
+    if created and timeline.is_enabled():
+        timeline.followers_changed(instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def check_hot_unfollow(sender, instance, **kwargs):
+    if timeline.is_enabled():
+        timeline.followers_changed(instance.author_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.get_backend().index_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    search.get_backend().index_comments([instance.pk])
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    # Своя строка индекса: каскадное удаление поста не пересобирает его
+    search.get_backend().remove_comments([instance.pk])
+
+
+@receiver(post_save, sender=Group)
+def index_group_posts(sender, instance, created, **kwargs):
+    if not created:
+        search.get_backend().index_posts(
+            instance.posts.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    # После SET_NULL посты группы уже не найти по group_id
+    instance.search_post_ids = list(
+        instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def index_ungrouped_posts(sender, instance, **kwargs):
+    search.get_backend().index_posts(instance.search_post_ids)
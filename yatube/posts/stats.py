@@ -0,0 +1,78 @@
+"""Денормализованные счётчики пользователя (UserStats).
+
+Счётчики меняются сигналами на создание и удаление постов, подписок и
+комментариев. Строка создаётся лениво с честным подсчётом, а команда
+rebuild_user_stats пересчитывает все строки с нуля.
+"""
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+    'comments_count': (Comment, 'author'),
+}
+
+
+def count(user_id):
+    """Считает все счётчики пользователя по исходным таблицам."""
+    # С основной базы: счётчики пишутся туда, отставание реплики в них
+    # осталось бы до следующего rebuild
+    return {
+        field: model.objects.using(DEFAULT_DB_ALIAS).filter(
+            **{f'{owner}_id': user_id}).count()
+        for field, (model, owner) in COUNTERS.items()
+    }
+
+
+def rebuild(user_id):
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=count(user_id))
+    return stats
+
+
+@transaction.atomic
+def rebuild_all():
+    """Пересчитывает счётчики всех пользователей четырьмя GROUP BY.
+
+    Удаление и вставка идут одной транзакцией: иначе строку между ними
+    создал бы for_user параллельного запроса, и bulk_create упал бы.
+    """
+    values = {
+        user_id: dict.fromkeys(COUNTERS, 0)
+        for user_id in User.objects.values_list('pk', flat=True)
+    }
+    for field, (model, owner) in COUNTERS.items():
+        rows = model.objects.values_list(owner).annotate(total=Count('pk'))
+        for user_id, total in rows.order_by():
+            values[user_id][field] = total
+    UserStats.objects.all().delete()
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id, **row) for user_id, row in values.items()],
+        batch_size=500
+    )
+    return len(values)
+
+
+def change(user_id, field, delta):
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{field: Greatest(F(field) + delta, 0)})
+    # Уменьшать нечего: строки нет, её честно посчитает rebuild.
+    # Создавать её при каскадном удалении пользователя нельзя.
+    if not updated and delta > 0:
+        rebuild(user_id)
+
+
+def for_user(user):
+    """Счётчики пользователя одним запросом по первичному ключу."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return rebuild(user.pk)
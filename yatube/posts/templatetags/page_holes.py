@@ -0,0 +1,35 @@
+from django import template
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.http import urlencode
+
+from posts import page_cache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name):
+    """Фрагмент из page_cache.HOLES: сам или заглушка на общей странице."""
+    request = context['request']
+    fragment = context.template.engine.get_template(page_cache.HOLES[name])
+    match = request.resolver_match
+    view_name = match.view_name if match else ''
+    if not page_cache.is_shared(request):
+        with context.push(view_name=view_name):
+            return fragment.render(context)
+    if page_cache.variant(request) == 'guest':
+        with context.push(user=AnonymousUser(), view_name=view_name):
+            return fragment.render(context)
+    url = '{}?{}'.format(
+        reverse('posts:fragment', kwargs={'name': name}),
+        urlencode({'view': view_name})
+    )
+    if settings.PAGE_CACHE_HOLES == 'esi':
+        return format_html('<esi:include src="{}"/>', url)
+    # Пока скрипт не заменил блок, виден вариант для гостя
+    with context.push(user=AnonymousUser(), view_name=view_name):
+        fallback = fragment.render(context)
+    return format_html('<div data-hole="{}">{}</div>', url, fallback)
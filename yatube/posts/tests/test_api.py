@@ -0,0 +1,147 @@
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовая группа'
+        )
+        for i in range(settings.POSTS_ON_PAGES + 2):
+            Post.objects.create(
+                author=cls.user, text=f'Пост {i}', group=cls.group)
+        cls.post = Post.objects.latest('pub_date', 'pk')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds(self):
+        urls = {
+            reverse('posts:api_index'): self.client,
+            reverse('posts:api_group_list',
+                    kwargs={'slug': self.group.slug}): self.client,
+            reverse('posts:api_profile',
+                    kwargs={'username': self.user.username}): self.client,
+            reverse('posts:api_follow_index'): self.reader_client,
+        }
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                data = client.get(url).json()
+                self.assertEqual(
+                    len(data['results']), settings.POSTS_ON_PAGES)
+                self.assertEqual(data['results'][0], {
+                    'id': self.post.pk,
+                    'text': self.post.text,
+                    'pub_date': self.post.pub_date.isoformat(),
+                    'author': self.user.username,
+                    'group': self.group.slug,
+                    'image': None,
+                })
+                self.assertIsNone(data['previous'])
+                rest = client.get(data['next']).json()
+                self.assertEqual(len(rest['results']), 2)
+                self.assertIsNone(rest['next'])
+
+    def test_sparse_fields(self):
+        data = self.client.get(
+            reverse('posts:api_index'), {'fields': 'id,text'}).json()
+        self.assertEqual(
+            data['results'][0], {'id': self.post.pk, 'text': self.post.text})
+        self.assertIn('fields=id%2Ctext', data['next'])
+
+    def test_unknown_field(self):
+        response = self.client.get(
+            reverse('posts:api_index'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_follow_requires_login(self):
+        response = self.client.get(reverse('posts:api_follow_index'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_post_detail(self):
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        data = self.client.get(reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk}
+        )).json()
+        self.assertEqual(data['id'], self.post.pk)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']['results']],
+            ['Комментарий']
+        )
+        response = self.client.get(
+            reverse('posts:api_post_detail', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_not_modified_skips_database(self):
+        url = reverse('posts:api_index')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        url = reverse('posts:api_index')
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        # Правка не меняет даты постов, но меняет ленту
+        with patch('posts.feed_cache.time.time',
+                   return_value=time.time() + 60):
+            post = Post.objects.get(pk=self.post.pk)
+            post.text = 'Исправленный пост'
+            post.save()
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_make_etag_stale(self):
+        detail_url = reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk})
+        follow_url = reverse('posts:api_follow_index')
+        etags = {
+            'index': self.client.get(reverse('posts:api_index'))['ETag'],
+            'detail': self.client.get(detail_url)['ETag'],
+            'follow': self.reader_client.get(follow_url)['ETag'],
+        }
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        response = self.client.get(
+            detail_url, HTTP_IF_NONE_MATCH=etags['detail'])
+        self.assertEqual(response.status_code, 200)
+
+        Follow.objects.filter(user=self.reader).delete()
+        response = self.reader_client.get(
+            follow_url, HTTP_IF_NONE_MATCH=etags['follow'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        response = self.client.get(
+            reverse('posts:api_index'), HTTP_IF_NONE_MATCH=etags['index'])
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,99 @@
+import csv
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportContentTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, text='Пост в группе', group=self.group)
+        self.old_post = Post.objects.create(
+            author=self.reader, text='Старый пост')
+        Post.objects.filter(pk=self.old_post.pk).update(
+            pub_date=datetime.datetime(2015, 1, 1))
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def export(self, *args):
+        out = StringIO()
+        call_command('export_content', self.dir, *args, stdout=out)
+        return out.getvalue()
+
+    def read_jsonl(self, name):
+        with open(os.path.join(self.dir, name), encoding='utf-8') as stream:
+            return [json.loads(line) for line in stream]
+
+    def test_export_jsonl(self):
+        out = self.export('--chunk-size', '1')
+        self.assertIn('posts.jsonl: 2', out)
+        posts = self.read_jsonl('posts.jsonl')
+        self.assertEqual(posts[0]['text'], 'Пост в группе')
+        self.assertEqual(posts[0]['author'], 'Author')
+        self.assertEqual(posts[0]['group'], 'group')
+        self.assertEqual(posts[1]['group'], '')
+        self.assertEqual(
+            self.read_jsonl('comments.jsonl')[0]['post'], self.post.pk)
+        self.assertEqual(
+            self.read_jsonl('follows.jsonl'),
+            [{'user': 'Reader', 'author': 'Author'}]
+        )
+        self.assertEqual(self.read_jsonl('groups.jsonl')[0]['slug'], 'group')
+
+    def test_export_csv_is_compressed(self):
+        self.export('--format', 'csv', '--only', 'posts')
+        self.assertEqual(os.listdir(self.dir), ['posts.csv.gz'])
+        path = os.path.join(self.dir, 'posts.csv.gz')
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as stream:
+            rows = list(csv.DictReader(stream))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]['pub_date'], '2015-01-01T00:00:00')
+
+    def test_filters(self):
+        self.export('--since', '2020-01-01', '--group', 'group')
+        self.assertEqual(
+            [post['text'] for post in self.read_jsonl('posts.jsonl')],
+            ['Пост в группе']
+        )
+        self.assertEqual(len(self.read_jsonl('comments.jsonl')), 1)
+        self.export('--until', '2016-01-01', '--author', 'Reader')
+        self.assertEqual(
+            [post['text'] for post in self.read_jsonl('posts.jsonl')],
+            ['Старый пост']
+        )
+        self.assertEqual(self.read_jsonl('comments.jsonl'), [])
+
+    def test_round_trip_with_import(self):
+        self.export('--only', 'posts')
+        Post.objects.all().delete()
+        call_command(
+            'import_posts', os.path.join(self.dir, 'posts.jsonl'),
+            stdout=StringIO()
+        )
+        self.assertEqual(
+            Post.objects.get(author=self.reader).pub_date,
+            datetime.datetime(2015, 1, 1)
+        )
+        self.assertEqual(
+            Post.objects.get(author=self.author).group, self.group)
@@ -0,0 +1,116 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts import feed_cache, search
+from posts.models import Group, Post, UserStats
+
+User = get_user_model()
+
+RECORDS = [
+    {
+        'text': 'Первый пост из архива',
+        'author': 'Archivist',
+        'group': 'archive',
+        'group_title': 'Архив',
+        'pub_date': '2015-03-01T10:00:00',
+    },
+    {'text': 'Второй пост', 'author': 'Existing', 'group': ''},
+    {'text': 'Третий пост', 'author': 'Archivist', 'group': 'archive'},
+]
+
+
+class ImportPostsTest(TestCase):
+    def setUp(self):
+        self.existing = User.objects.create_user(username='Existing')
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.dir):
+            os.remove(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    def write_jsonl(self, records, name='posts.jsonl'):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as stream:
+            for record in records:
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+    def import_posts(self, path, *args):
+        out = StringIO()
+        call_command('import_posts', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_jsonl(self):
+        version = feed_cache.get_version(feed_cache.INDEX)
+        out = self.import_posts(
+            self.write_jsonl(RECORDS), '--batch-size', '2')
+        self.assertIn('Загружено постов: 3', out)
+        author = User.objects.get(username='Archivist')
+        self.assertFalse(author.has_usable_password())
+        group = Group.objects.get(slug='archive')
+        self.assertEqual(group.title, 'Архив')
+        self.assertEqual(group.posts.count(), 2)
+        post = Post.objects.get(text='Первый пост из архива')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertIsNone(Post.objects.get(text='Второй пост').group)
+        self.assertEqual(self.existing.posts.count(), 1)
+        self.assertEqual(UserStats.objects.get(user=author).posts_count, 2)
+        self.assertEqual(
+            [post.text for post in search.search('архива')[:10]],
+            ['Первый пост из архива']
+        )
+        self.assertNotEqual(
+            feed_cache.get_version(feed_cache.INDEX), version)
+
+    def test_import_gzipped_csv(self):
+        path = os.path.join(self.dir, 'posts.csv.gz')
+        with gzip.open(path, 'wt', encoding='utf-8', newline='') as stream:
+            writer = csv.DictWriter(stream, fieldnames=RECORDS[0])
+            writer.writeheader()
+            writer.writerows(RECORDS)
+        self.import_posts(path)
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(Group.objects.count(), 1)
+
+    def test_invalid_record(self):
+        path = self.write_jsonl([{'author': 'Archivist'}])
+        with self.assertRaisesMessage(CommandError, 'Строка 1'):
+            self.import_posts(path)
+        self.assertFalse(Post.objects.exists())
+
+    def test_failed_batch_keeps_earlier_batches_consistent(self):
+        path = self.write_jsonl([RECORDS[0], {'author': 'Archivist'}])
+        version = feed_cache.get_version(feed_cache.INDEX)
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            self.import_posts(path, '--batch-size', '1')
+        author = User.objects.get(username='Archivist')
+        self.assertEqual(UserStats.objects.get(user=author).posts_count, 1)
+        self.assertNotEqual(
+            feed_cache.get_version(feed_cache.INDEX), version)
+
+    def test_images_are_scheduled_for_thumbnails(self):
+        records = [
+            {**RECORDS[1], 'image': 'posts/old.jpg'},
+            RECORDS[2],
+        ]
+        with patch('posts.thumbnails.schedule') as schedule:
+            self.import_posts(self.write_jsonl(records))
+        self.assertEqual(
+            [call.args[0].image.name for call in schedule.call_args_list],
+            ['posts/old.jpg']
+        )
+
+    def test_unknown_format(self):
+        with self.assertRaises(CommandError):
+            self.import_posts(os.path.join(self.dir, 'posts.txt'))
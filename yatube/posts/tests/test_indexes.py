@@ -0,0 +1,79 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def bad_steps(plan):
+    """Полный проход по таблице или сортировка во временном B-дереве."""
+    return [
+        step for step in plan
+        if 'TEMP B-TREE' in step
+        or step.startswith('SCAN') and 'INDEX' not in step
+    ]
+
+
+# Лента подписок без FOLLOW_FEED_FANOUT сливает посты многих авторов и
+# сортирует их; от этой сортировки избавляет как раз раскладка FeedEntry.
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+@override_settings(FOLLOW_FEED_FANOUT=True)
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='Author')
+        cls.user = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовая группа'
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(15):
+            post = Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group)
+            Comment.objects.create(post=post, author=cls.user, text='Текст')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_feed_queries_use_indexes(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        # Курсорные страницы: первая и следующая за ней
+        for url in urls[:4]:
+            page_obj = self.client.get(url + '?cursor=').context['page_obj']
+            urls += [url + '?cursor=', f'{url}?cursor={page_obj.next_cursor}']
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                with self.subTest(url=url, sql=query['sql']):
+                    self.assertEqual(
+                        bad_steps(query_plan(query['sql'])), [])
@@ -0,0 +1,135 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class MatchQueryTest(TestCase):
+    def test_words_are_quoted(self):
+        self.assertEqual(
+            search.match_query('Кот NEAR(пёс)*'), '"кот" "near" "пёс"*')
+
+    def test_short_last_word_is_not_prefix(self):
+        self.assertEqual(search.match_query('кот у'), '"кот" "у"')
+
+    def test_empty(self):
+        self.assertEqual(search.match_query(' !? '), '')
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        # Тесты меняют и удаляют объекты, поэтому они свои у каждого теста
+        self.user = User.objects.create_user(username='NoName')
+        self.group = Group.objects.create(
+            title='Кошки', slug='cats', description='Про кошек')
+        self.in_text = Post.objects.create(
+            author=self.user, text='Рыжий кот спит на окне')
+        self.in_group = Post.objects.create(
+            author=self.user, text='Про сон', group=self.group)
+        self.in_comment = Post.objects.create(
+            author=self.user, text='Фотография окна')
+        Comment.objects.create(
+            post=self.in_comment, author=self.user, text='Где же кошки?')
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_searches_text_group_and_comments(self):
+        self.assertEqual(self.found('рыжий'), [self.in_text])
+        self.assertCountEqual(
+            self.found('кошки'), [self.in_group, self.in_comment])
+        self.assertCountEqual(
+            self.found('окн'), [self.in_text, self.in_comment])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.found('кот окне'), [self.in_text])
+        self.assertEqual(self.found('кот сон'), [])
+
+    def test_text_ranks_above_comments(self):
+        post = Post.objects.create(author=self.user, text='Кошки и коты')
+        self.assertEqual(self.found('кошки')[0], post)
+
+    def test_index_follows_changes(self):
+        self.in_text.text = 'Серый пёс'
+        self.in_text.save()
+        self.assertEqual(self.found('рыжий'), [])
+        self.assertEqual(self.found('серый'), [self.in_text])
+
+        self.group.title = 'Собаки'
+        self.group.save()
+        self.assertEqual(self.found('собаки'), [self.in_group])
+
+        self.in_comment.comments.all().delete()
+        self.assertEqual(self.found('кошки'), [])
+
+        self.in_text.delete()
+        self.assertEqual(self.found('серый'), [])
+
+    def test_comment_is_indexed_on_its_own(self):
+        comment = Comment.objects.create(
+            post=self.in_text, author=self.user, text='Пушистый')
+        self.assertEqual(self.found('пушистый'), [self.in_text])
+        comment.text = 'Лохматый'
+        comment.save()
+        self.assertEqual(self.found('пушистый'), [])
+        self.assertEqual(self.found('лохматый'), [self.in_text])
+        # Остальной документ поста не тронут
+        self.assertEqual(self.found('рыжий'), [self.in_text])
+
+    def test_post_delete_does_not_reindex_post(self):
+        Comment.objects.bulk_create(
+            Comment(post=self.in_comment, author=self.user, text='Ещё')
+            for _ in range(20)
+        )
+        backend = search.SQLiteFTSBackend
+        with patch.object(backend, 'index_posts') as index_posts:
+            self.in_comment.delete()
+        index_posts.assert_not_called()
+        self.assertEqual(self.found('кошки'), [self.in_group])
+        self.assertEqual(self.found('окн'), [self.in_text])
+
+    def test_group_delete_reindexes_posts(self):
+        self.group.delete()
+        self.assertEqual(self.found('кошки'), [self.in_comment])
+
+    def test_rebuild(self):
+        with search.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.found('рыжий'), [])
+        search.get_backend().rebuild()
+        self.assertEqual(self.found('рыжий'), [self.in_text])
+
+    def test_pagination_keeps_query(self):
+        for i in range(settings.POSTS_ON_PAGES + 1):
+            Post.objects.create(author=self.user, text=f'Кот номер {i}')
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, settings.POSTS_ON_PAGES + 2)
+        self.assertEqual(len(page_obj), settings.POSTS_ON_PAGES)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82&amp;page=2')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_counts_and_pages_all_matches(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Котёнок {i}') for i in range(1005))
+        search.get_backend().rebuild()
+        results = search.search('котёнок')
+        self.assertEqual(results.count(), 1005)
+        self.assertEqual(len(results[1000:1010]), 5)
+
+    @override_settings(SEARCH_BACKEND='posts.search.LikeBackend')
+    def test_like_backend(self):
+        # LIKE в SQLite не сравнивает кириллицу без учёта регистра
+        self.assertEqual(self.found('Рыжий'), [self.in_text])
+        self.assertEqual(
+            self.found('окн'), [self.in_comment, self.in_text])
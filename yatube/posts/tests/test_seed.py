@@ -0,0 +1,51 @@
+import statistics
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django.test import TestCase
+
+from posts import seed
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class SeedTest(TestCase):
+    def test_sizes_and_notable_objects(self):
+        objects = seed.seed(500, users=50, groups=5, random_seed=3)
+        self.assertEqual(Post.objects.count(), 500)
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 1000)
+        self.assertEqual(
+            UserStats.objects.get(user=objects['author']).posts_count,
+            objects['author'].posts.count()
+        )
+        self.assertEqual(objects['post'], Post.objects.latest('pub_date'))
+
+    def test_deterministic(self):
+        seed.seed(200, users=30, random_seed=5)
+        first = list(Post.objects.values_list(
+            'text', 'author__username', 'pub_date').order_by('pk'))
+        follows = set(Follow.objects.values_list(
+            'user__username', 'author__username'))
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        seed.seed(200, users=30, random_seed=5)
+        self.assertEqual(first, list(Post.objects.values_list(
+            'text', 'author__username', 'pub_date').order_by('pk')))
+        self.assertEqual(follows, set(Follow.objects.values_list(
+            'user__username', 'author__username')))
+
+    def test_follow_fan_in_is_skewed(self):
+        objects = seed.seed(2000, users=200, random_seed=1)
+        fan_in = list(
+            User.objects.annotate(followers=Count('following'))
+            .values_list('followers', flat=True)
+        )
+        self.assertGreater(
+            objects['author'].following.count(),
+            10 * statistics.median(fan_in)
+        )
@@ -0,0 +1,86 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import stats
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class UserStatsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='Author')
+        self.user = User.objects.create_user(username='Reader')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_views_maintain_counters(self):
+        self.client.post(reverse('posts:post_create'), data={'text': 'Пост'})
+        post = Post.objects.get()
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'Комментарий'}
+        )
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        reader = self.stats(self.user)
+        self.assertEqual(
+            (reader.posts_count, reader.comments_count,
+             reader.following_count),
+            (1, 1, 1)
+        )
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+    def test_deletes_maintain_counters(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.user).comments_count, 0)
+
+    def test_profile_reads_counters_with_author(self):
+        Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.author}))
+        self.assertEqual(response.context['author_stats'].posts_count, 1)
+        self.assertContains(response, 'Подписчиков: 1')
+
+    def test_missing_row_is_counted_lazily(self):
+        Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.all().delete()
+        response = self.client.get(reverse(
+            'posts:post_detail',
+            kwargs={'post_id': Post.objects.get().id}
+        ))
+        self.assertEqual(response.context['post_count'], 1)
+
+    def test_rebuild_user_stats_command(self):
+        Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.update(posts_count=42, followers_count=42)
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+
+    def test_rebuild_all_keeps_rows_on_failure(self):
+        Post.objects.create(author=self.author, text='Пост')
+        with mock.patch.object(UserStats.objects, 'bulk_create',
+                               side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                stats.rebuild_all()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
@@ -0,0 +1,159 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовый текст',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_pending_thumbnail_renders_placeholder(self):
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend.'
+                        '_create_thumbnail') as create:
+            response = self.client.get(reverse('posts:index'))
+        create.assert_not_called()
+        self.assertContains(response, 'img/placeholder.svg')
+        self.assertIsNone(thumbnails.ready_picture(self.post))
+
+    def test_generated_thumbnail_replaces_placeholder(self):
+        self.client.get(reverse('posts:index'))
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        picture = thumbnails.ready_picture(self.post)
+        self.assertIsNotNone(picture)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, picture['src'])
+        self.assertNotContains(response, 'img/placeholder.svg')
+
+    def test_manifest_describes_thumbnails(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        manifest = thumbnails.load_manifest(self.post)
+        self.assertEqual(manifest['name'], self.post.image.name)
+        self.assertEqual(
+            manifest['hash'], thumbnails.content_hash(self.post.image))
+        self.assertEqual(
+            (manifest['width'], manifest['height']),
+            (thumbnails.BASE_WIDTH, thumbnails.BASE_HEIGHT)
+        )
+        for format_variants in manifest['variants'].values():
+            for _, name in format_variants:
+                self.assertTrue(default_storage.exists(name))
+
+    def test_render_does_not_touch_kvstore_or_storage(self):
+        thumbnails.generate(self.post.pk)
+        with mock.patch('sorl.thumbnail.default.kvstore') as kvstore, \
+                mock.patch.object(default_storage, 'exists') as exists:
+            response = self.client.get(reverse('posts:index'))
+        kvstore.get.assert_not_called()
+        exists.assert_not_called()
+        self.assertContains(response, '<picture>')
+
+    def test_replaced_image_makes_manifest_stale(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        self.post.image = SimpleUploadedFile(
+            'other.gif', SMALL_GIF, 'image/gif')
+        self.post.save()
+        self.assertIsNone(thumbnails.load_manifest(self.post))
+
+    def test_picture_lists_variants(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        picture = thumbnails.ready_picture(self.post)
+        self.assertEqual(
+            [source['type'] for source in picture['sources']],
+            ['image/webp', 'image/jpeg']
+        )
+        # Оригинал 2x1: шире самого узкого варианта ничего не создаётся
+        webp, jpeg = (source['srcset'] for source in picture['sources'])
+        self.assertRegex(webp, r'^\S+\.webp 320w$')
+        self.assertRegex(jpeg, r'^\S+\.jpg 320w$')
+        manifest = thumbnails.load_manifest(self.post)
+        for width, name in sum(manifest['variants'].values(), []):
+            with Image.open(default_storage.open(name)) as image:
+                self.assertEqual(image.width, width)
+        self.assertEqual(
+            (picture['width'], picture['height']),
+            (thumbnails.BASE_WIDTH, thumbnails.BASE_HEIGHT)
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, picture['sources'][0]['srcset'])
+
+    def test_variant_geometry_keeps_aspect(self):
+        self.assertEqual(thumbnails.variant_geometry(960), '960x339')
+        self.assertEqual(thumbnails.variant_geometry(320), '320x113')
+
+    def test_upload_schedules_generation(self):
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            self.authorized_client.post(reverse('posts:post_create'), {
+                'text': 'С картинкой',
+                'image': SimpleUploadedFile(
+                    'new.gif', SMALL_GIF, 'image/gif'),
+            })
+        schedule.assert_called_once()
+        self.assertEqual(schedule.call_args[0][0].text, 'С картинкой')
+
+    def test_edit_without_new_image_does_not_schedule(self):
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            self.authorized_client.post(
+                reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+                {'text': 'Новый текст'}
+            )
+        schedule.assert_not_called()
+
+    def test_command_generates_missing_thumbnails(self):
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertIsNotNone(thumbnails.load_manifest(self.post))
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('0', out.getvalue())
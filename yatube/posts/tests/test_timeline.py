@@ -0,0 +1,162 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+@override_settings(FOLLOW_FEED_FANOUT=True)
+class TimelineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Author')
+        self.user = User.objects.create_user(username='Reader')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def follow_index(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_post_create_fans_out_to_followers(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'})
+        post = Post.objects.get(text='Новый пост')
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists())
+        self.assertEqual(self.follow_index(), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(3)
+        ]
+        self.client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.follow_index(), posts[::-1])
+        self.client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}
+        ))
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(self.follow_index(), [])
+
+    @override_settings(FOLLOW_FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_hot_author_is_read_on_demand(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(
+            user=User.objects.create_user(username='Other'),
+            author=self.author
+        )
+        post = Post.objects.create(author=self.author, text='Популярный')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.follow_index(), [post])
+
+    @override_settings(FOLLOW_FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_cooled_down_author_is_fanned_out(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(author=self.author, text='Популярный')
+        Follow.objects.filter(user=other).delete()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists())
+        post = Post.objects.create(author=self.author, text='Обычный')
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists())
+
+    def test_hot_authors_are_cached(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text='Пост')
+        self.follow_index()
+        # COUNT и посты из FeedEntry; сессия и пользователь — из кэша
+        with self.assertNumQueries(2):
+            self.follow_index()
+
+    @override_settings(FOLLOW_FEED_DEPTH=3, POSTS_ON_PAGES=2)
+    def test_timeline_is_trimmed_and_read_past_depth(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(5)
+        ][::-1]
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(), 3)
+        url = reverse('posts:follow_index')
+        pages = [
+            list(self.client.get(url, {'page': page}).context['page_obj'])
+            for page in (1, 2, 3)
+        ]
+        self.assertEqual(sum(pages, []), posts)
+
+        found = []
+        cursor = ''
+        while cursor is not None:
+            page_obj = self.client.get(
+                url, {'cursor': cursor}).context['page_obj']
+            found += page_obj
+            previous, cursor = page_obj.previous_cursor, page_obj.next_cursor
+        self.assertEqual(found, posts)
+        page_obj = self.client.get(url, {'cursor': previous}).context[
+            'page_obj']
+        self.assertEqual(list(page_obj), posts[2:4])
+
+    @override_settings(FOLLOW_FEED_DEPTH=2, POSTS_ON_PAGES=2,
+                       FOLLOW_FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_hot_author_pages_past_depth_keep_other_authors(self):
+        hot = User.objects.create_user(username='Hot')
+        Follow.objects.create(user=self.user, author=hot)
+        Follow.objects.create(
+            user=User.objects.create_user(username='Other'), author=hot)
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [
+            Post.objects.create(
+                author=hot if i % 2 else self.author, text=f'Пост {i}')
+            for i in range(10)
+        ][::-1]
+        url = reverse('posts:follow_index')
+        pages = [
+            list(self.client.get(url, {'page': page}).context['page_obj'])
+            for page in range(1, 6)
+        ]
+        self.assertEqual(sum(pages, []), posts)
+
+        found = []
+        cursor = ''
+        while cursor is not None:
+            page_obj = self.client.get(
+                url, {'cursor': cursor}).context['page_obj']
+            found += page_obj
+            cursor = page_obj.next_cursor
+        self.assertEqual(found, posts)
+
+    @override_settings(FOLLOW_FEED_DEPTH=3)
+    def test_backfill_keeps_depth(self):
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(5)
+        ][::-1]
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(
+            list(FeedEntry.objects.filter(user=self.user)
+                 .order_by('-pub_date').values_list('post', flat=True)),
+            [post.pk for post in posts[:3]]
+        )
+        self.assertEqual(self.follow_index(), posts)
+
+    def test_rebuild_timelines_command(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.follow_index(), [post])
@@ -1,15 +1,20 @@
 import shutil
 import tempfile
+from array import array
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
 
-from posts.models import Post, Group, Follow
+from posts import feed_cache, follows
+from posts.models import Comment, Post, Group, Follow
+from posts.pagination import KeysetPaginator
 
 User = get_user_model()
 
@@ -184,28 +189,117 @@ class StaticURLTests(TestCase):
 
 class CacheTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(
             username='MySelfUser',
             password='Test12345',
             email='test@test.com'
         )
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовая группа'
+        )
+        self.group_new = Group.objects.create(
+            title='Тестовая группа новая',
+            slug='test_slug_new',
+            description='Тестовая группа новая'
+        )
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовый текст',
+            group=self.group
+        )
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
 
     def test_cache(self):
-        response = self.client.get(reverse('posts:index'))
-        cache1 = response.content
-        self.assertEqual(len(response.context['page_obj']), 0)
+        self.client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.text)
+
+    def test_create_invalidates_cache(self):
+        for url in self.urls:
+            self.client.get(url)
         new_post = Post.objects.create(
             author=self.user,
-            text='Тестовый текст',
+            text='Новый текст',
+            group=self.group
         )
-        response = self.client.get(reverse('posts:index'))
-        cache2 = response.content
-        self.assertEqual(cache1, cache2)
-        cache.delete('index_page')
-        response = self.client.get(reverse('posts:index'))
-        self.assertTrue(
-            new_post.text in response.context['page_obj'][0].text)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, new_post.text)
+
+    def test_delete_invalidates_cache(self):
+        for url in self.urls:
+            self.client.get(url)
+        self.post.delete()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotContains(response, self.post.text)
+
+    def test_post_edit_invalidates_old_group(self):
+        old_group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug})
+        self.assertContains(self.client.get(old_group_url), self.post.text)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Изменённый текст', 'group': self.group_new.id}
+        )
+        self.assertNotContains(
+            self.client.get(old_group_url), 'Изменённый текст')
+        self.assertNotContains(self.client.get(old_group_url), 'Тестовый')
+        self.assertContains(
+            self.client.get(reverse(
+                'posts:group_list', kwargs={'slug': self.group_new.slug})),
+            'Изменённый текст'
+        )
+
+    def test_group_rename_invalidates_feeds(self):
+        for url in self.urls:
+            self.client.get(url)
+        self.group.slug = 'renamed_slug'
+        self.group.save()
+        for url in self.urls[::2]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, '/group/renamed_slug/')
+                self.assertNotContains(response, '/group/test_slug/')
+
+    def test_author_rename_invalidates_feeds(self):
+        for url in self.urls:
+            self.client.get(url)
+        self.user.first_name = 'Новое'
+        self.user.last_name = 'Имя'
+        self.user.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.client.get(url), 'Автор: Новое Имя')
+
+    def test_login_keeps_feed_versions(self):
+        version = feed_cache.get_version(feed_cache.INDEX)
+        self.client.login(username='MySelfUser', password='Test12345')
+        self.assertEqual(feed_cache.get_version(feed_cache.INDEX), version)
+
+    def test_pages_are_cached_separately(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}')
+            for i in range(settings.POSTS_ON_PAGES)
+        )
+        first = self.client.get(reverse('posts:index'))
+        second = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertNotContains(first, self.post.text)
+        self.assertContains(second, self.post.text)
 
 
 class PaginatorViewsTest(TestCase):
@@ -277,8 +371,398 @@ class PaginatorViewsTest(TestCase):
             len(response.context['page_obj']), self.last_part_posts)
 
 
+class KeysetPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(
+            username='NoName',
+            email='1@1.com',
+            password='Ss12345678')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовая группа'
+        )
+        cls.posts_count = 23
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый текст {i}', group=cls.group)
+            for i in range(cls.posts_count)
+        )
+        # Одинаковое время публикации проверяет разрешение по id.
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        Follow.objects.get_or_create(
+            user=User.objects.create_user(username='Follower'),
+            author=self.user
+        )
+
+    def walk(self, url):
+        seen = []
+        response = self.client.get(url + '?cursor=')
+        while True:
+            page_obj = response.context['page_obj']
+            seen.extend(post.pk for post in page_obj)
+            if not page_obj.next_cursor:
+                return seen, page_obj
+            response = self.client.get(
+                url, {'cursor': page_obj.next_cursor})
+
+    def test_cursor_pages_cover_every_post_once(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True)
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                seen, last_page = self.walk(url)
+                self.assertEqual(seen, expected)
+                self.assertFalse(last_page.has_next())
+                self.assertTrue(last_page.has_previous())
+
+    def test_previous_cursor_returns_previous_page(self):
+        url = reverse('posts:index')
+        first = self.client.get(url + '?cursor=').context['page_obj']
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}).context['page_obj']
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}).context['page_obj']
+        self.assertFalse(first.has_previous())
+        self.assertEqual(list(back), list(first))
+        self.assertEqual(len(first), settings.POSTS_ON_PAGES)
+
+    def test_cursor_page_skips_count_query(self):
+        url = reverse('posts:index')
+        first = self.client.get(url + '?cursor=').context['page_obj']
+        with self.assertNumQueries(1):
+            page_obj = KeysetPaginator(
+                Post.objects.all(), settings.POSTS_ON_PAGES,
+                first.next_cursor).get_page()
+            page_obj.has_next()
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('posts:index'), {'cursor': 'x'})
+        page_obj = response.context['page_obj']
+        self.assertFalse(page_obj.has_previous())
+        self.assertEqual(len(page_obj), settings.POSTS_ON_PAGES)
+
+    @override_settings(POSTS_PAGINATION='keyset')
+    def test_follow_index_uses_keyset_setting(self):
+        self.authorized_client.force_login(User.objects.get(
+            username='Follower'))
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.paginator.is_keyset)
+        self.assertIsNotNone(page_obj.next_cursor)
+        self.assertContains(response, '?cursor=')
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовая группа'
+        )
+        for i in range(settings.POSTS_ON_PAGES + 3):
+            author = User.objects.create_user(username=f'author_{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'slug_{i}',
+                description='Тестовая группа'
+            )
+            Post.objects.create(author=author, text='Текст', group=group)
+            Post.objects.create(author=author, text='Текст', group=cls.group)
+            Follow.objects.create(user=cls.follower, author=author)
+        cls.author = author
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.follower)
+
+    def test_feed_query_count_does_not_depend_on_rows(self):
+        # Пагинатор: COUNT + выборка постов вместе с автором и группой;
+        # Last-Modified берётся из кэша версий, без запроса.
+        pages = {
+            reverse('posts:index'): 2,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 3,
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}): 3,
+        }
+        for url, queries in pages.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']),
+                    min(settings.POSTS_ON_PAGES,
+                        response.context['page_obj'].paginator.count)
+                )
+
+    def test_follow_index_query_count(self):
+        url = reverse('posts:follow_index')
+        # Пользователь и подписки (сессия уже в кэше) + COUNT и выборка.
+        with self.assertNumQueries(4):
+            response = self.authorized_client.get(url)
+        self.assertEqual(
+            len(response.context['page_obj']), settings.POSTS_ON_PAGES)
+        # Пользователь и подписки уже в кэше, JOIN по Follow не нужен
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('posts_follow', queries[1]['sql'])
+
+    def test_feed_defers_unrendered_columns(self):
+        post = Post.objects.feed().first()
+        self.assertEqual(post.get_deferred_fields(), set())
+        self.assertIn('description', post.group.get_deferred_fields())
+        self.assertIn('password', post.author.get_deferred_fields())
+
+
+class CommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(author=cls.user, text='Текст')
+        cls.comments = []
+        for i in range(settings.COMMENTS_ON_PAGE + 5):
+            author = User.objects.create_user(username=f'commenter_{i}')
+            cls.comments.append(Comment.objects.create(
+                post=cls.post, author=author, text=f'Комментарий {i}'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(
+            list(comments), self.comments[:settings.COMMENTS_ON_PAGE])
+        self.assertIsNotNone(comments.next_cursor)
+
+    def test_newest_first(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            {'order': 'new'}
+        )
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[::-1][:settings.COMMENTS_ON_PAGE]
+        )
+
+    def test_load_more_returns_next_chunk(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        cursor = self.client.get(url).context['comments'].next_cursor
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        comments = response.context['comments']
+        self.assertEqual(
+            list(comments), self.comments[settings.COMMENTS_ON_PAGE:])
+        self.assertIsNone(comments.next_cursor)
+
+    def test_authors_loaded_with_comments(self):
+        # Пост и одна выборка комментариев вместе с авторами.
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'commenter_0')
+
+    def test_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовая группа'
+        )
+        Post.objects.create(author=cls.user, text='Текст', group=cls.group)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_not_modified(self):
+        # Без рендера; остаётся только поиск группы или автора
+        for url, queries in zip(self.urls, (0, 1, 1)):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_new_post_changes_etag(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Post.objects.create(author=self.user, text='Новый', group=self.group)
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_profile_etag_follows_counters(self):
+        url = self.urls[2]
+        etag = self.client.get(url)['ETag']
+        follower = User.objects.create_user(username='Follower')
+        Follow.objects.create(user=follower, author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_headers(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn(
+                    f's-maxage={settings.FEED_HTTP_MAX_AGE}',
+                    response['Cache-Control']
+                )
+                self.assertIn('Cookie', response['Vary'])
+                self.assertIn('Last-Modified', response)
+                response = self.authorized_client.get(url)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertIn('no-cache', response['Cache-Control'])
+
+
+@override_settings(FULL_PAGE_CACHE=True)
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовая группа'
+        )
+        Post.objects.create(author=cls.user, text='Текст', group=cls.group)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_second_request_from_cache(self):
+        other_client = Client()
+        other_client.force_login(
+            User.objects.create_user(username='Other'))
+        for url in self.urls:
+            with self.subTest(url=url):
+                content = self.authorized_client.get(url).content
+                with self.assertNumQueries(0):
+                    response = other_client.get(url)
+                self.assertEqual(response.content, content)
+                content = self.client.get(url).content
+                with self.assertNumQueries(0):
+                    response = Client().get(url)
+                self.assertEqual(response.content, content)
+
+    def test_new_post_invalidates_page(self):
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(author=self.user, text='Новый', group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Новый')
+
+    def test_shared_page_has_holes(self):
+        response = self.authorized_client.get(self.urls[0])
+        self.assertContains(response, 'data-hole="/fragments/header/')
+        self.assertContains(response, 'data-hole="/fragments/switcher/')
+        self.assertNotContains(response, 'Избранные авторы')
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_guest_page_has_no_holes(self):
+        guest = self.client.get(self.urls[0])
+        self.assertNotContains(guest, 'data-hole="')
+        self.assertContains(guest, 'Войти')
+        self.assertIn('Cookie', guest['Vary'])
+        self.assertIn('public', guest['Cache-Control'])
+        # Вошедший не получит 304 на копию гостя
+        response = self.authorized_client.get(
+            self.urls[0], HTTP_IF_NONE_MATCH=guest['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PAGE_CACHE_HOLES='esi')
+    def test_esi_holes(self):
+        response = self.authorized_client.get(self.urls[0])
+        self.assertContains(
+            response,
+            '<esi:include src="/fragments/header/?view=posts%3Aindex"'
+        )
+
+    def test_fragment(self):
+        url = reverse('posts:fragment', kwargs={'name': 'switcher'})
+        response = self.authorized_client.get(url, {'view': 'posts:index'})
+        self.assertContains(response, 'Избранные авторы')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        url = reverse('posts:fragment', kwargs={'name': 'header'})
+        response = self.authorized_client.get(url)
+        self.assertContains(response, self.user.username)
+        url = reverse('posts:fragment', kwargs={'name': 'unknown'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_private_pages_not_cached(self):
+        url = reverse('posts:profile', kwargs={'username': self.user.username})
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'data-hole="')
+        self.assertIn('Cookie', response['Vary'])
+
+    @override_settings(FULL_PAGE_CACHE=False)
+    def test_disabled(self):
+        response = self.authorized_client.get(self.urls[0])
+        self.assertNotContains(response, 'data-hole="')
+        self.assertContains(response, 'Избранные авторы')
+
+
 class FollowTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.author = User.objects.create_user(
             username='TestUser',
             password='Test12345',
@@ -312,6 +796,41 @@ class FollowTest(TestCase):
                                 kwargs={'username': self.author.username}))
         self.assertEqual(Follow.objects.count(), count_follow)
 
+    def test_follow_state_is_cached(self):
+        profile = reverse(
+            'posts:profile', kwargs={'username': self.author.username})
+        self.client.get(profile)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(profile)
+        self.assertFalse(response.context['following'])
+        self.assertFalse(
+            any('posts_follow' in query['sql'] for query in queries))
+        self.client.get(reverse('posts:profile_follow',
+                        kwargs={'username': self.author.username}))
+        self.assertTrue(self.client.get(profile).context['following'])
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        self.assertFalse(self.client.get(profile).context['following'])
+
+    def test_writes_ignore_stale_follow_cache(self):
+        username = self.author.username
+        Follow.objects.create(user=self.user, author=self.author)
+        # Массив другого воркера, не заметившего подписку
+        cache.set(follows.KEY.format(self.user.pk), array('I'))
+        self.client.get(reverse('posts:profile_follow',
+                        kwargs={'username': username}))
+        self.assertEqual(Follow.objects.count(), 1)
+        cache.set(follows.KEY.format(self.user.pk), array('I'))
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': username}))
+        self.assertFalse(Follow.objects.exists())
+        # И наоборот: «подписан» в кэше при пустой базе
+        cache.set(
+            follows.KEY.format(self.user.pk), array('I', [self.author.pk]))
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': username}))
+        self.assertFalse(follows.is_following(self.user.pk, self.author.pk))
+
     def test_follow_index(self):
         self.post = Post.objects.create(
             author=self.author,
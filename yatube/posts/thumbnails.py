@@ -0,0 +1,169 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Шаблоны больше не создают миниатюры сами: тег post_picture берёт
+готовые из манифеста в Post.image_manifest (размеры, пути вариантов,
+хэш оригинала), а пока его нет, выводится заглушка. После сохранения
+поста с новой картинкой schedule() отдаёт генерацию в пул потоков
+процесса (POST_THUMBNAIL_WORKERS), брокер очередей не нужен.
+Для картинок, загруженных раньше, есть команда generate_thumbnails.
+
+Кроме основной миниатюры 960x339 создаются варианты шириной WIDTHS в
+WebP и JPEG для srcset в <picture>. Варианты шире оригинала не
+создаются: растянутая картинка весит больше, а чётче не становится.
+Самый узкий вариант есть всегда: у оригинала уже WIDTHS[0] он
+растягивается, чтобы совпасть с шириной, указанной в srcset.
+"""
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+
+from . import feed_cache
+from .models import Post
+
+BASE_WIDTH, BASE_HEIGHT = 960, 339
+GEOMETRY = f'{BASE_WIDTH}x{BASE_HEIGHT}'
+OPTIONS = {'crop': 'center', 'upscale': True}
+WIDTHS = (320, 640, 960, 1920)
+FORMATS = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+# Ширина картинки в вёрстке: колонка контейнера Bootstrap или весь экран
+SIZES = '(min-width: 1200px) 1110px, 100vw'
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+
+
+def variant_geometry(width):
+    return f'{width}x{round(width * BASE_HEIGHT / BASE_WIDTH)}'
+
+
+def content_hash(image):
+    digest = hashlib.sha256()
+    with image.open('rb'):
+        for chunk in image.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(post):
+    """Манифест миниатюр поста или None, если он не готов или устарел."""
+    if not post.image or not post.image_manifest:
+        return None
+    try:
+        manifest = json.loads(post.image_manifest)
+    except ValueError:
+        return None
+    # После замены картинки манифест описывает старый файл
+    if manifest.get('name') != post.image.name:
+        return None
+    return manifest
+
+
+def ready_picture(post):
+    """Данные для <picture> или None, пока миниатюры не готовы.
+
+    Всё берётся из манифеста на строке поста: ни KV-хранилища sorl,
+    ни файлов на рендере не трогаем.
+    """
+    manifest = load_manifest(post)
+    if manifest is None:
+        return None
+    url = default.storage.url
+    sources = [
+        {
+            'type': FORMATS[image_format],
+            'srcset': ', '.join(
+                f'{url(name)} {width}w' for width, name in items),
+        }
+        for image_format, items in manifest['variants'].items()
+    ]
+    return {
+        'src': url(manifest['src']),
+        'width': manifest['width'],
+        'height': manifest['height'],
+        'sizes': SIZES,
+        'sources': sources,
+    }
+
+
+def build_manifest(image):
+    """Создаёт миниатюры картинки и описывает их."""
+    base = get_thumbnail(image, GEOMETRY, **OPTIONS)
+    widths = [
+        width for width in WIDTHS
+        if width <= image.width or width == WIDTHS[0]
+    ]
+    variants = {}
+    for image_format in FORMATS:
+        thumbnails = [
+            get_thumbnail(
+                image, variant_geometry(width), crop='center',
+                upscale=width == WIDTHS[0], format=image_format
+            )
+            for width in widths
+        ]
+        # Ширина из самого файла: srcset не должен обещать больше
+        variants[image_format] = [
+            [thumbnail.width, thumbnail.name] for thumbnail in thumbnails]
+    return {
+        'name': image.name,
+        'hash': content_hash(image),
+        'width': base.width,
+        'height': base.height,
+        'src': base.name,
+        'variants': variants,
+    }
+
+
+def generate(post_id):
+    """Создаёт миниатюры, сохраняет манифест и сбрасывает ленты."""
+    post = Post.objects.only(
+        'image', 'image_manifest', 'author', 'group').filter(
+        pk=post_id).first()
+    if post is None or not post.image:
+        return
+    manifest = build_manifest(post.image)
+    # update() без сигналов; если картинку успели заменить, не пишем
+    Post.objects.filter(pk=post_id, image=post.image.name).update(
+        image_manifest=json.dumps(manifest))
+    feed_cache.bump_post(post)
+
+
+def _generate_in_worker(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру поста %s', post_id)
+    finally:
+        # Соединения потоков пула сами не закрываются
+        connections.close_all()
+
+
+def executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+def schedule(post):
+    """Ставит миниатюру в очередь после фиксации транзакции."""
+    if not post.image:
+        return
+    post_id = post.pk
+    if settings.POST_THUMBNAIL_ASYNC:
+        transaction.on_commit(
+            lambda: executor().submit(_generate_in_worker, post_id))
+    else:
+        transaction.on_commit(lambda: generate(post_id))
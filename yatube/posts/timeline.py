@@ -0,0 +1,295 @@
+"""Лента подписок с раскладкой постов при записи (fan-out-on-write).
+
+Пока FOLLOW_FEED_FANOUT выключен, лента собирается при чтении по списку
+авторов из кэша подписок (posts/follows.py). Во включённом режиме каждый
+новый пост сразу раскладывается подписчикам в FeedEntry, а посты
+авторов, у которых подписчиков больше FOLLOW_FEED_FANOUT_MAX_FOLLOWERS
+(«горячих»), по-прежнему подмешиваются при чтении.
+
+Горячего автора определяет только UserStats.followers_count; множество
+горячих авторов лежит в кэше и сбрасывается, когда автор переходит
+порог. Автор, ставший обычным, сразу раскладывается по лентам всех
+своих подписчиков: пока он был горячим, его посты туда не попадали.
+
+В FeedEntry читателя хранятся только FOLLOW_FEED_DEPTH самых свежих
+записей: раскладка и добавление постов после подписки обрезают ленту.
+Записи всегда остаются началом ленты без пропусков, а страницы за их
+концом собираются при чтении, как без раскладки. Лента, у которой за
+концом FeedEntry что-то есть, отмечается в кэше как неполная.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import Count, F, Q
+from django.utils.functional import cached_property
+
+from . import follows
+from .models import FeedEntry, Follow, Post, UserStats
+from .pagination import PREVIOUS, KeysetPaginator, decode_cursor
+
+HOT_KEY = 'posts:hot_authors'
+INCOMPLETE_KEY = 'posts:timeline_incomplete:{}'
+
+
+def is_enabled():
+    return settings.FOLLOW_FEED_FANOUT
+
+
+def hot_author_ids():
+    """Множество id авторов, чьи посты не раскладываются по лентам."""
+    ids = cache.get(HOT_KEY)
+    if ids is None:
+        # С основной базы: множество лежит в кэше без срока
+        ids = frozenset(UserStats.objects.using(DEFAULT_DB_ALIAS).filter(
+            followers_count__gt=settings.FOLLOW_FEED_FANOUT_MAX_FOLLOWERS
+        ).values_list('user_id', flat=True))
+        cache.set(HOT_KEY, ids, None)
+    return ids
+
+
+def forget_hot_authors():
+    cache.delete(HOT_KEY)
+    # Параллельный запрос мог положить в кэш старое множество до коммита
+    transaction.on_commit(lambda: cache.delete(HOT_KEY))
+
+
+def _mark_incomplete(user_ids):
+    values = dict.fromkeys(
+        (INCOMPLETE_KEY.format(user_id) for user_id in user_ids), True)
+    if values:
+        cache.set_many(values, None)
+        # Иначе параллельное чтение до коммита вернуло бы False в кэш
+        transaction.on_commit(lambda: cache.set_many(values, None))
+
+
+def last_entry(user, using=None):
+    """Ключ (дата, id поста) самой старой записи FeedEntry или None."""
+    return FeedEntry.objects.using(using).filter(user=user).order_by(
+        'pub_date', F('post').asc()
+    ).values_list('pub_date', 'post').first()
+
+
+def is_incomplete(user):
+    """Есть ли у ленты посты старше последней записи FeedEntry."""
+    key = INCOMPLETE_KEY.format(user.pk)
+    incomplete = cache.get(key)
+    if incomplete is None:
+        # С основной базы: отметка лежит в кэше без срока
+        last = last_entry(user, DEFAULT_DB_ALIAS)
+        older = pull_posts(user).using(DEFAULT_DB_ALIAS)
+        if last is not None:
+            date, pk = last
+            older = older.filter(
+                Q(pub_date__lt=date) | Q(pub_date=date, pk__lt=pk))
+        incomplete = older.exists()
+        cache.set(key, incomplete, None)
+    return incomplete
+
+
+def _chunks(ids):
+    ids = list(ids)
+    size = connection.features.max_query_params - 1
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def trim(user_ids):
+    """Оставляет в лентах читателей FOLLOW_FEED_DEPTH свежих записей."""
+    depth = settings.FOLLOW_FEED_DEPTH
+    table = FeedEntry._meta.db_table
+    with connection.cursor() as cursor:
+        for chunk in _chunks(user_ids):
+            over = list(
+                FeedEntry.objects.filter(user_id__in=chunk).order_by()
+                .values('user_id').annotate(total=Count('pk'))
+                .filter(total__gt=depth).values_list('user_id', flat=True)
+            )
+            if not over:
+                continue
+            placeholders = ', '.join(['%s'] * len(over))
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                f'PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+                f') AS position FROM {table} '
+                f'WHERE user_id IN ({placeholders})) '
+                f'WHERE position > %s)',
+                [*over, depth]
+            )
+            _mark_incomplete(over)
+
+
+def _add(user_ids, posts):
+    """Добавляет посты в ленты и обрезает их до FOLLOW_FEED_DEPTH."""
+    user_ids = list(user_ids)
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id in user_ids
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True
+    )
+    trim(user_ids)
+
+
+def _fill(user_ids, posts):
+    """Добавляет свежие посты из posts; остальные оставляет чтению."""
+    depth = settings.FOLLOW_FEED_DEPTH
+    posts = list(posts.order_by('-pub_date', '-pk').values_list(
+        'pk', 'pub_date')[:depth + 1])
+    _add(user_ids, posts[:depth])
+    if len(posts) > depth:
+        _mark_incomplete(user_ids)
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты подписчиков автора."""
+    if post.author_id in hot_author_ids():
+        return
+    followers = Follow.objects.filter(
+        author=post.author_id).values_list('user_id', flat=True)
+    _add(followers, [(post.pk, post.pub_date)])
+
+
+def backfill(user, author):
+    """Добавляет в ленту свежие посты автора после подписки."""
+    if author.pk in hot_author_ids():
+        return
+    _fill([user.pk], Post.objects.filter(author=author))
+
+
+def followers_changed(author_id, delta):
+    """Следит, не перешёл ли автор порог после изменения на delta.
+
+    Переход ловится по самому счётчику, а не по кэшу горячих авторов:
+    вытесненное множество собралось бы заново уже с новым счётчиком.
+    """
+    limit = settings.FOLLOW_FEED_FANOUT_MAX_FOLLOWERS
+    count = UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first()
+    if delta > 0 and count == limit + 1:
+        forget_hot_authors()
+    elif delta < 0 and count == limit:
+        forget_hot_authors()
+        followers = Follow.objects.filter(
+            author=author_id).values_list('user_id', flat=True)
+        _fill(followers, Post.objects.filter(author=author_id))
+
+
+def prune(user, author):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def rebuild(user):
+    """Пересобирает ленту читателя с нуля."""
+    FeedEntry.objects.filter(user=user).delete()
+    cache.delete(INCOMPLETE_KEY.format(user.pk))
+    _fill([user.pk], pull_posts(user).exclude(author__in=hot_author_ids()))
+
+
+def hot_authors(user):
+    """Горячие авторы из подписок; без запросов, пока всё в кэше."""
+    hot = hot_author_ids()
+    if not hot:
+        return []
+    return [pk for pk in follows.author_ids(user.pk) if pk in hot]
+
+
+def pull_posts(user):
+    """Посты ленты, собранные при чтении по подпискам."""
+    authors = follows.author_ids(user.pk)
+    # Список id из кэша вместо JOIN по Follow, если влезает в запрос
+    if len(authors) > connection.features.max_query_params:
+        return Post.objects.filter(author__following__user=user)
+    return Post.objects.filter(author__in=authors)
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя; с раскладкой — из FeedEntry."""
+    if not is_enabled():
+        return pull_posts(user)
+    authors = hot_authors(user)
+    if not authors:
+        # Порядок по столбцам FeedEntry читает её индекс без сортировки;
+        # KeysetPaginator берёт эти же ключи из order_by. Строка
+        # 'feed_entries__post' сортировала бы по Meta.ordering поста.
+        return Post.objects.filter(feed_entries__user=user).order_by(
+            F('feed_entries__pub_date').desc(),
+            F('feed_entries__post').desc(),
+        )
+    return Post.objects.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=authors)
+    )
+
+
+def within_entries(user, post):
+    """Не старше ли пост самой старой записи FeedEntry читателя.
+
+    Выше этой границы в FeedEntry лежат все посты обычных авторов, и
+    смесь с горячими авторами совпадает с лентой по подпискам. Ниже
+    горячие авторы дали бы страницу без постов обычных.
+    """
+    if not hot_authors(user):
+        return True
+    last = last_entry(user)
+    return last is not None and (post.pub_date, post.pk) >= last
+
+
+def keyset_page(user, per_page, cursor=None):
+    """Страница ленты по курсору.
+
+    Страницы читаются из FeedEntry, пока её хватает на целую страницу.
+    У неполной ленты страница, на которой FeedEntry кончилась, и
+    страницы назад от курсора за её концом собираются при чтении.
+    """
+    posts = timeline_posts(user).feed()
+    if not is_enabled() or not is_incomplete(user):
+        return KeysetPaginator(posts, per_page, cursor).get_page()
+    decoded = decode_cursor(cursor) if cursor else None
+    if decoded is None or decoded[0] != PREVIOUS:
+        page = KeysetPaginator(posts, per_page, cursor).get_page()
+        if (page.next_cursor is not None
+                and within_entries(user, page.object_list[-1])):
+            return page
+    pull = pull_posts(user).feed()
+    return KeysetPaginator(pull, per_page, cursor).get_page()
+
+
+class TimelinePaginator(Paginator):
+    """Номерные страницы неполной ленты.
+
+    Число постов считается по подпискам, а страница берётся из FeedEntry,
+    если записей на неё хватило и она не заходит за конец FeedEntry.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(timeline_posts(user).feed(), per_page)
+        self.user = user
+        self.pull = pull_posts(user).feed()
+
+    @cached_property
+    def count(self):
+        return self.pull.count()
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        posts = list(self.object_list[bottom:top])
+        if (len(posts) < top - bottom
+                or posts and not within_entries(self.user, posts[-1])):
+            posts = list(self.pull[bottom:top])
+        return self._get_page(posts, number, self)
+
+
+def paginator(user, per_page):
+    """Paginator номерных страниц ленты подписок."""
+    if is_enabled() and is_incomplete(user):
+        return TimelinePaginator(user, per_page)
+    return Paginator(timeline_posts(user).feed(), per_page)
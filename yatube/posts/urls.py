@@ -1,6 +1,8 @@
 from django.urls import path
 
-from . import views
+from core.budgets import Budget
+
+from . import api, views
 
 app_name = 'posts'
 
@@ -16,6 +18,13 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path('search/', views.post_search, name='search'),
+    path('fragments/<str:name>/', views.fragment, name='fragment'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -27,4 +36,43 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/posts/', api.index, name='api_index'),
+    path(
+        'api/posts/<int:post_id>/',
+        api.post_detail,
+        name='api_post_detail'
+    ),
+    path(
+        'api/group/<slug:slug>/posts/',
+        api.group_posts,
+        name='api_group_list'
+    ),
+    path(
+        'api/profile/<str:username>/posts/',
+        api.profile,
+        name='api_profile'
+    ),
+    path('api/follow/posts/', api.follow_index, name='api_follow_index'),
 ]
+
+# Бюджеты маршрутов, проверяет core.tests.BudgetTest
+budgets = {
+    'index': Budget(queries=2),
+    'group_list': Budget(queries=3),
+    'profile': Budget(queries=3),
+    'post_detail': Budget(queries=2),
+    'post_create': Budget(queries=5),
+    'post_edit': Budget(queries=5),
+    'add_comment': Budget(queries=9),
+    'post_comments': Budget(queries=2),
+    'search': Budget(queries=3),
+    'fragment': Budget(queries=2),
+    'follow_index': Budget(queries=5),
+    'profile_follow': Budget(queries=6),
+    'profile_unfollow': Budget(queries=10),
+    'api_index': Budget(queries=1),
+    'api_post_detail': Budget(queries=2),
+    'api_group_list': Budget(queries=2),
+    'api_profile': Budget(queries=2),
+    'api_follow_index': Budget(queries=4),
+}
@@ -2,73 +2,209 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import patch_cache_control
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
 
+from core.routers import replica_reads
+
+from . import (
+    feed_cache, follows, page_cache, search, stats, thumbnails, timeline)
+from .conditional import conditional, feed_cache_control
 from .forms import PostForm, CommentForm
 from .models import Group, Post, Follow
+from .pagination import KeysetPaginator
+
+COMMENT_ORDERING = {
+    'old': ('created', 'pk'),
+    'new': ('-created', '-pk'),
+}
+
+
+def is_keyset(request):
+    return (request.GET.get('cursor') is not None
+            or settings.POSTS_PAGINATION == 'keyset')
 
 
 def paginator(request, post_list):
+    if is_keyset(request):
+        return KeysetPaginator(
+            post_list, settings.POSTS_ON_PAGES,
+            request.GET.get('cursor')
+        ).get_page()
     paginator = Paginator(post_list, settings.POSTS_ON_PAGES)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
+def lazy_paginator(request, post_list):
+    """Страница, которая не обращается к базе, пока её не отрисуют.
+
+    Если фрагмент ленты уже лежит в кэше, запросы за постами не нужны.
+    """
+    return SimpleLazyObject(lambda: paginator(request, post_list))
+
+
+def comments_page(request, post):
+    """Порция комментариев поста с авторами одним запросом."""
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERING:
+        order = 'old'
+    comments = post.comments.select_related('author').only(
+        'post', 'text', 'created', 'author__username'
+    ).order_by(*COMMENT_ORDERING[order])
+    page = KeysetPaginator(
+        comments, settings.COMMENTS_ON_PAGE, request.GET.get('cursor')
+    ).get_page()
+    return page, order
+
+
+def feed_page(request, template, context, scopes, post_list, *vary_on,
+              shareable=False):
+    """Страница ленты с ETag/Last-Modified и заголовками кэширования.
+
+    Пока версии лент и вид страницы для пользователя не менялись,
+    клиент получает 304 без рендера и без запросов за постами.
+    shareable-страница при включённом кэше страниц рендерится без
+    данных пользователя (см. page_cache) и общая для всех.
+    """
+    shared = shareable and page_cache.share(request, scopes)
+    etag, last_modified = feed_cache.validators(
+        scopes,
+        page_cache.variant(request) if shared else request.user.pk,
+        settings.POSTS_PAGINATION, request.GET.get('page'),
+        request.GET.get('cursor'), *vary_on
+    )
+    response = conditional(
+        request, etag, last_modified,
+        lambda: render(request, template, context)
+    )
+    return feed_cache_control(request, response, shared)
+
+
+@replica_reads
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = paginator(request, post_list)
+    post_list = Post.objects.feed()
+    page_obj = lazy_paginator(request, post_list)
     context = {
         'page_obj': page_obj,
+        **feed_cache.feed_cache(request, feed_cache.INDEX),
     }
-    return render(request, 'posts/index.html', context)
+    return feed_page(
+        request, 'posts/index.html', context, [feed_cache.INDEX], post_list,
+        shareable=True
+    )
 
 
+@replica_reads
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginator(request, posts)
+    posts = group.posts.feed()
+    page_obj = lazy_paginator(request, posts)
+    scope = feed_cache.group_scope(group.pk)
     context = {
         'group': group,
-        'posts': posts,
         'page_obj': page_obj,
+        **feed_cache.feed_cache(request, scope),
     }
-    return render(request, 'posts/group_list.html', context)
+    return feed_page(
+        request, 'posts/group_list.html', context, [scope], posts,
+        shareable=True
+    )
 
 
+@replica_reads
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    post_count = post_list.count()
-    page_obj = paginator(request, post_list)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    post_list = author.posts.feed()
+    page_obj = lazy_paginator(request, post_list)
     following = request.user.is_authenticated and (
-        Follow.objects.filter(user=request.user, author=author).exists())
+        follows.is_following(request.user.pk, author.pk))
+    author_stats = stats.for_user(author)
+    scope = feed_cache.author_scope(author.pk)
     context = {
-        'post_count': post_count,
         'page_obj': page_obj,
         'author': author,
+        'author_stats': author_stats,
         'following': following,
+        # Кнопка подписки рисуется внутри кэшируемого фрагмента
+        **feed_cache.feed_cache(
+            request, scope, following, request.user == author),
     }
-    return render(request, 'posts/profile.html', context)
+    # Счётчики и имя автора меняются без новых постов
+    return feed_page(
+        request, 'posts/profile.html', context, [scope], post_list,
+        following, author.get_full_name(), author_stats.posts_count,
+        author_stats.followers_count, author_stats.following_count,
+        author_stats.comments_count
+    )
 
 
+@replica_reads
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     author = post.author
     username = request.user.username
-    post_count = author.posts.count()
+    post_count = stats.for_user(author).posts_count
     form = CommentForm(request.POST or None)
-    comments = post.comments.all
+    comments, comment_order = comments_page(request, post)
     context = {
         'post': post,
         'post_count': post_count,
         'username': username,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'comment_order': comment_order,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@replica_reads
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments, comment_order = comments_page(request, post)
+    context = {
+        'post': post,
+        'comments': comments,
+        'comment_order': comment_order,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def fragment(request, name):
+    """Дырка общей страницы из кэша (page_cache.HOLES) для пользователя."""
+    if name not in page_cache.HOLES:
+        raise Http404
+    view_name = request.GET.get('view', '')
+    response = render(request, page_cache.HOLES[name], {
+        'view_name': view_name,
+        'index': view_name == 'posts:index',
+        'follow': view_name == 'posts:follow_index',
+    })
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@replica_reads
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'page_obj': Paginator(
+            search.search(query), settings.POSTS_ON_PAGES
+        ).get_page(request.GET.get('page')),
+        # Ссылки пагинатора сохраняют запрос
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -79,7 +215,11 @@ def post_create(request):
         author = request.user
         new_form = form.save(commit=False)
         new_form.author = author
-        new_form.save()
+        # Транзакция только вокруг записи: с BEGIN IMMEDIATE она держит
+        # блокировку записи SQLite, и рендер формы не должен её занимать
+        with transaction.atomic():
+            new_form.save()
+            thumbnails.schedule(new_form)
         return redirect('posts:profile', username=author.username)
     context = {
         'form': form,
@@ -90,6 +230,7 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
+    old_group_id = post.group_id
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
@@ -99,6 +240,11 @@ def post_edit(request, post_id):
         return redirect('posts:post_detail', post_id=post_id)
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
+        # Сигнал сбросит ленты новой группы, а старую знает только view
+        if old_group_id not in (None, post.group_id):
+            feed_cache.bump(feed_cache.group_scope(old_group_id))
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -116,15 +262,22 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@replica_reads
 @login_required
 def follow_index(request):
     user = request.user
-    post_list = Post.objects.filter(author__following__user=user)
-    page_obj = paginator(request, post_list)
+    if is_keyset(request):
+        page_obj = timeline.keyset_page(
+            user, settings.POSTS_ON_PAGES, request.GET.get('cursor'))
+    else:
+        page_obj = timeline.paginator(
+            user, settings.POSTS_ON_PAGES
+        ).get_page(request.GET.get('page', 1))
     context = {
         'page_obj': page_obj,
     }
@@ -132,20 +285,23 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
-    follow = Follow.objects.filter(user=user, author=author).exists()
-    if not follow and user != author:
-        Follow.objects.create(user=user, author=author)
+    # Запись не доверяет кэшу подписок: он может отставать от базы.
+    # Сброс без изменений в базе чинит отставший массив кнопки.
+    if user != author:
+        Follow.objects.get_or_create(user=user, author=author)
+    follows.forget(user.pk)
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
-    follow = Follow.objects.filter(user=user, author=author)
-    if follow.exists() and user != author:
-        follow.delete()
+    Follow.objects.filter(user=user, author=author).delete()
+    follows.forget(user.pk)
     return redirect('posts:profile', username=username)
@@ -0,0 +1,62 @@
+"""Бэкенд аутентификации с пользователем из кэша.
+
+AuthenticationMiddleware на каждом запросе достаёт пользователя сессии
+из базы ради имени в шапке. CachedModelBackend.get_user берёт из кэша
+поля шапки и проверок доступа и хэш сессии; запись пользователя
+сбрасывает их (users/signals.py), поэтому смена пароля по-прежнему
+разлогинивает остальные сессии. Хэш пароля и почта в кэш не попадают:
+пользователь собирается с отложенными полями, и они читаются из базы
+только при обращении.
+"""
+from types import MethodType
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+UserModel = get_user_model()
+
+USER_KEY = 'users:user:{}'
+HEADER = {
+    UserModel._meta.pk.attname, 'username', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser',
+}
+# from_db ждёт значения в порядке полей модели
+FIELDS = tuple(
+    field.attname for field in UserModel._meta.concrete_fields
+    if field.attname in HEADER
+)
+
+
+def forget(user_id):
+    cache.delete(USER_KEY.format(user_id))
+
+
+def _session_auth_hash(user):
+    # После set_password пароль загружен, и хэш считается заново:
+    # иначе update_session_auth_hash сохранил бы в сессию старый
+    if 'password' in user.get_deferred_fields():
+        return user.cached_session_hash
+    return type(user).get_session_auth_hash(user)
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cached = (
+                    [getattr(user, name) for name in FIELDS],
+                    user.get_session_auth_hash(),
+                )
+                cache.set(key, cached, settings.USER_CACHE_TIMEOUT)
+            return user
+        values, session_hash = cached
+        user = UserModel.from_db(DEFAULT_DB_ALIAS, FIELDS, values)
+        user.cached_session_hash = session_hash
+        user.get_session_auth_hash = MethodType(_session_auth_hash, user)
+        return user
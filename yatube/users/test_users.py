@@ -1,5 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from users.backends import USER_KEY, CachedModelBackend
 
 User = get_user_model()
 
@@ -34,3 +40,58 @@ class StaticURLTests(TestCase):
             with self.subTest(url=url):
                 response = self.guest_client.get(url)
                 self.assertTemplateUsed(response, template)
+
+
+class CachedAuthTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='NoName')
+        self.client.force_login(self.user)
+
+    def lookups(self):
+        """Запросы к сессиям и пользователю при показе страницы."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('about:author'))
+        return response, [
+            query['sql'] for query in queries
+            if 'django_session' in query['sql'] or 'auth_user' in query['sql']
+        ]
+
+    def test_page_view_skips_session_and_user_queries(self):
+        self.lookups()
+        response, queries = self.lookups()
+        self.assertEqual(queries, [])
+        self.assertContains(response, 'Пользователь: NoName')
+
+    def test_user_change_resets_cache(self):
+        self.lookups()
+        self.user.username = 'Renamed'
+        self.user.save()
+        response, queries = self.lookups()
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, 'Пользователь: Renamed')
+
+    def test_password_change_logs_out(self):
+        self.lookups()
+        self.user.set_password('new-password')
+        self.user.save()
+        response, _ = self.lookups()
+        self.assertNotContains(response, 'Пользователь:')
+
+    def test_cache_has_no_password(self):
+        self.lookups()
+        cached = cache.get(USER_KEY.format(self.user.pk))
+        self.assertNotIn(self.user.password, repr(cached))
+        user = CachedModelBackend().get_user(self.user.pk)
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertEqual(user.get_session_auth_hash(),
+                         self.user.get_session_auth_hash())
+
+    def test_password_change_keeps_own_session(self):
+        # Так меняет пароль PasswordChangeView: через request.user
+        self.lookups()
+        user = CachedModelBackend().get_user(self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        self.assertEqual(user.get_session_auth_hash(),
+                         User.objects.get(pk=user.pk).get_session_auth_hash())
@@ -1,6 +1,8 @@
 from django.contrib.auth.views import LoginView, LogoutView
 from django.urls import path
 
+from core.budgets import Budget
+
 from . import views
 
 app_name = 'users'
@@ -18,3 +20,10 @@ urlpatterns = [
         name='login'
     ),
 ]
+
+# Бюджеты маршрутов, проверяет core.tests.BudgetTest
+budgets = {
+    'signup': Budget(queries=0),
+    'logout': Budget(queries=4),
+    'login': Budget(queries=0),
+}
@@ -52,28 +52,42 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.page_cache.PageCacheMiddleware',
+    'core.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Кэширующий загрузчик разбирает шаблон один раз на процесс, wsgi.py
+# разбирает все при старте (core/templating.py). При разработке правки
+# шаблонов видны без перезапуска, если не задать TEMPLATE_CACHE=1.
+TEMPLATE_CACHE = not DEBUG or os.getenv('TEMPLATE_CACHE', '') == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -91,13 +105,51 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite с WAL: читатели не ждут писателей (core/backends/sqlite3)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # В WAL не теряет целостность при сбое, fsync только на checkpoint
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — в килобайтах: 64 МБ на соединение
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, прагмы не повторяются
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
+        'OPTIONS': {
+            'pragmas': SQLITE_PRAGMAS,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Реплики для чтения лент (core/routers.py): DB_REPLICAS файлов
+# db.replicaN.sqlite3, копии основной базы от команды sync_replicas
+DATABASE_REPLICAS = [
+    f'replica{number}'
+    for number in range(1, int(os.getenv('DB_REPLICAS', 0)) + 1)
+]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'OPTIONS': {'pragmas': dict(SQLITE_PRAGMAS, query_only='ON')},
+        # В тестах реплика смотрит в тестовую основную базу
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -140,20 +192,73 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 #  LOGOUT_REDIRECT_URL = 'posts:index'
 
+# Пользователь сессии берётся из кэша, а не из базы на каждой странице.
+# ModelBackend остаётся в списке: сессии, открытые до кэша, хранят его
+# путь, и без него их владельцев разлогинило бы
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+USER_CACHE_TIMEOUT = 60 * 60
+# cached_db читает сессию из кэша и пишет и в кэш, и в базу;
+# signed_cookies хранит её в подписанной куке без кэша и базы
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.getenv(
+    'SESSION_BACKEND', 'cached_db')
+
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_ON_PAGES = 10
+COMMENTS_ON_PAGE = 20
+# 'page' — нумерованные страницы, 'keyset' — курсоры по (pub_date, id)
+POSTS_PAGINATION = os.getenv('POSTS_PAGINATION', 'page')
+
+# Лента подписок, разложенная при публикации поста (см. posts/timeline.py)
+FOLLOW_FEED_FANOUT = os.getenv('FOLLOW_FEED_FANOUT', '') == '1'
+FOLLOW_FEED_FANOUT_MAX_FOLLOWERS = 1000
+# Записей FeedEntry на читателя; более старые страницы собираются при чтении
+FOLLOW_FEED_DEPTH = 200
+# Массив подписок читателя сбрасывается сигналами (posts/follows.py)
+FOLLOWS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Миниатюры создаются в пуле потоков после загрузки (posts/thumbnails.py)
+POST_THUMBNAIL_ASYNC = os.getenv('POST_THUMBNAIL_ASYNC', '1') == '1'
+POST_THUMBNAIL_WORKERS = int(os.getenv('POST_THUMBNAIL_WORKERS', 2))
+
+# Поиск по постам (posts/search.py): FTS5 в SQLite или LIKE на других базах
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'posts.search.SQLiteFTSBackend')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Фрагменты лент сбрасываются по версиям (posts/feed_cache.py), а не по TTL
+FEED_CACHE_TIMEOUT = 60 * 15
+# Кэш целых страниц index и group_posts (posts/page_cache.py). Шапка и
+# переключатель лент догружаются скриптом ('js') или через ESI ('esi').
+FULL_PAGE_CACHE = os.getenv('FULL_PAGE_CACHE', '') == '1'
+PAGE_CACHE_HOLES = os.getenv('PAGE_CACHE_HOLES', 'js')
+# Сколько секунд обратный прокси может отдавать гостям копию ленты
+FEED_HTTP_MAX_AGE = int(os.getenv('FEED_HTTP_MAX_AGE', 60))
+
+# Бэкенд кэша выбирается окружением. locmem годится только для разработки:
+# у каждого воркера свой кэш, и сброс версий лент не доходит до соседей.
+# Для db таблицу создаёт python manage.py createcachetable, memcached
+# работает через python-memcached из requirements.txt.
+CACHE_BACKENDS = {
+    'locmem': ('core.cache.LocMemCache', 'yatube'),
+    'file': ('core.cache.FileBasedCache', os.path.join(BASE_DIR, 'cache')),
+    'db': ('core.cache.DatabaseCache', 'yatube_cache'),
+    'memcached': ('core.cache.MemcachedCache', '127.0.0.1:11211'),
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': '127.0.0.1:11211',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
     }
 }
 
@@ -161,7 +266,16 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
-
-DEBUG_TOOLBAR_CONFIG = {
-    "SHOW_TOOLBAR_CALLBACK": lambda request: True,
-}
+# Панель отладки только при разработке: DEBUG, DEBUG_TOOLBAR=1 и запрос
+# с адреса из INTERNAL_IPS. В продакшене замеры даёт core/profiling.py
+DEBUG_TOOLBAR = DEBUG and os.getenv('DEBUG_TOOLBAR', '') == '1'
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
+# Доля запросов, которые замеряет ProfilingMiddleware, и доля замеренных,
+# которые выполняются под cProfile
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.05))
+PROFILING_CPROFILE_RATE = float(os.getenv('PROFILING_CPROFILE_RATE', 0))
+PROFILING_BUFFER_SIZE = 10000
+PROFILING_TRACES = 20
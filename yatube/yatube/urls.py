@@ -3,20 +3,23 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import cache_health, profiling_report
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('posts.urls', namespace='posts')),
     path('auth/', include('users.urls', namespace='users')),
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('django.contrib.auth.urls')),
-    path('__debug__/', include('debug_toolbar.urls')),
+    path('health/cache/', cache_health, name='cache_health'),
+    path('profiling/', profiling_report, name='profiling'),
 ]
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
 
-if settings.DEBUG:
+if settings.DEBUG_TOOLBAR:
     import debug_toolbar
 
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)
@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
+from core import templating
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Шаблоны разбираются до первого запроса; с ошибкой воркер не стартует.
+# Без кэширующего загрузчика разобранное сразу бы выбрасывалось
+if settings.TEMPLATE_CACHE:
+    templating.preload()